@@ -1,48 +1,116 @@
 import streamlit as st
 import json
 from datetime import datetime
-import pandas as pd
 import os
+import time
+from typing import List, Optional, Tuple
 
 from src.simple_auth import SimpleAuthManager
-from src.database import FirestoreManager
-from src.models import SemesterPlan, AirlineAction
-from src.workflow import SimulationWorkflow
-from src.config import Config
+from src.database import FirestoreManager, get_firestore_manager
+from src.models import SemesterPlan, AirlineAction, AirlineState, MarketState
+from src.workflow import PlanBatcher
+from src.config import Config, get_streamlit_secrets
+from src.observability import configure_logging
 from src.instructor_dashboard import InstructorDashboard
+from src import json_utils
+
+
+@st.cache_resource
+def get_auth_manager() -> SimpleAuthManager:
+    """Single auth manager per server process (login state lives in session_state)"""
+    return SimpleAuthManager()
+
+
+@st.cache_resource
+def get_plan_batcher() -> PlanBatcher:
+    """Shared across sessions so concurrent submissions run as one workflow batch"""
+    return PlanBatcher()
+
+
+@st.cache_resource
+def get_instructor_dashboard() -> InstructorDashboard:
+    """Holds the compiled workflow and shared managers; no per-session state"""
+    return InstructorDashboard()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS)
+def cached_airline_state(team_id: str) -> Optional[AirlineState]:
+    return get_firestore_manager().get_airline_state(team_id)
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS)
+def cached_all_airline_and_market_states() -> Tuple[List[AirlineState], Optional[MarketState]]:
+    return get_firestore_manager().get_all_airline_and_market_states()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS)
+def cached_airline_and_market_state(team_id: str) -> Tuple[Optional[AirlineState], Optional[MarketState]]:
+    return get_firestore_manager().get_airline_and_market_state(team_id)
+
+
+# How long an airline state fetched on one page is reused by the others in the same session
+SESSION_AIRLINE_STATE_TTL_SECONDS = 10
+
+
+def remember_airline_state(airline_state: Optional[AirlineState]):
+    if airline_state:
+        st.session_state["airline_state"] = airline_state
+        st.session_state["airline_state_ts"] = time.monotonic()
+
+
+def session_airline_state(team_id: str) -> Optional[AirlineState]:
+    """Airline state shared across pages within one session, refetched when stale"""
+    airline_state = st.session_state.get("airline_state")
+    fetched_at = st.session_state.get("airline_state_ts", 0.0)
+    if (airline_state and airline_state.team_id == team_id
+            and time.monotonic() - fetched_at < SESSION_AIRLINE_STATE_TTL_SECONDS):
+        return airline_state
+    
+    airline_state = cached_airline_state(team_id)
+    remember_airline_state(airline_state)
+    return airline_state
+
+
+def clear_cached_state():
+    """Drop cached reads after the simulation wrote new airline/market state"""
+    st.session_state.pop("airline_state", None)
+    cached_airline_state.clear()
+    cached_all_airline_and_market_states.clear()
+    cached_airline_and_market_state.clear()
 
 
 def setup_streamlit_secrets():
     """Setup environment variables from Streamlit secrets for cloud deployment"""
     try:
-        if hasattr(st, 'secrets') and st.secrets:
+        secrets = get_streamlit_secrets()
+        if secrets:
             # Debug: Show what secrets we're trying to read
-            print(f"DEBUG: Available secrets keys: {list(st.secrets.keys())}")
+            print(f"DEBUG: Available secrets keys: {list(secrets.keys())}")
             
-            if 'FIRESTORE_PROJECT_ID' in st.secrets:
-                value = str(st.secrets['FIRESTORE_PROJECT_ID'])
+            if 'FIRESTORE_PROJECT_ID' in secrets:
+                value = str(secrets['FIRESTORE_PROJECT_ID'])
                 os.environ['FIRESTORE_PROJECT_ID'] = value
                 print(f"DEBUG: Set FIRESTORE_PROJECT_ID")
             
-            if 'GEMINI_API_KEY' in st.secrets:
-                value = str(st.secrets['GEMINI_API_KEY'])
+            if 'GEMINI_API_KEY' in secrets:
+                value = str(secrets['GEMINI_API_KEY'])
                 os.environ['GEMINI_API_KEY'] = value
                 print(f"DEBUG: Set GEMINI_API_KEY")
             
-            if 'LANGSMITH_API_KEY' in st.secrets:
-                os.environ['LANGSMITH_API_KEY'] = str(st.secrets['LANGSMITH_API_KEY'])
+            if 'LANGSMITH_API_KEY' in secrets:
+                os.environ['LANGSMITH_API_KEY'] = str(secrets['LANGSMITH_API_KEY'])
             
-            if 'STREAMLIT_AUTH_COOKIE_KEY' in st.secrets:
-                os.environ['STREAMLIT_AUTH_COOKIE_KEY'] = str(st.secrets['STREAMLIT_AUTH_COOKIE_KEY'])
+            if 'STREAMLIT_AUTH_COOKIE_KEY' in secrets:
+                os.environ['STREAMLIT_AUTH_COOKIE_KEY'] = str(secrets['STREAMLIT_AUTH_COOKIE_KEY'])
             
             # Setup Google Cloud credentials from Streamlit secrets
-            if 'gcp_service_account' in st.secrets:
+            if 'gcp_service_account' in secrets:
                 import tempfile
                 import json
                 
                 print("DEBUG: Setting up GCP credentials from secrets")
                 # Create temporary credentials file from secrets
-                gcp_creds = dict(st.secrets['gcp_service_account'])
+                gcp_creds = dict(secrets['gcp_service_account'])
                 
                 # Create temporary file
                 with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
@@ -67,6 +135,7 @@ def setup_streamlit_secrets():
 
 
 def main():
+    configure_logging()
     st.set_page_config(
         page_title="Airline Simulation",
         page_icon="✈️",
@@ -85,14 +154,15 @@ def main():
         
         # Debug info
         st.write("Debug Info:")
-        if hasattr(st, 'secrets'):
+        secrets = get_streamlit_secrets()
+        if secrets:
             try:
-                available_secrets = list(st.secrets.keys()) if st.secrets else []
+                available_secrets = list(secrets.keys())
                 st.write(f"Available secrets: {available_secrets}")
                 
                 # Check specific secrets
                 for key in ['FIRESTORE_PROJECT_ID', 'GEMINI_API_KEY', 'STREAMLIT_AUTH_COOKIE_KEY']:
-                    if key in st.secrets:
+                    if key in secrets:
                         st.write(f"✅ {key}: Found")
                     else:
                         st.write(f"❌ {key}: Missing")
@@ -122,8 +192,10 @@ def main():
     
     # Initialize managers with error handling
     try:
-        auth_manager = SimpleAuthManager()
-        db_manager = FirestoreManager()
+        auth_manager = get_auth_manager()
+        db_manager = get_firestore_manager()
+        # Every page shows market data; serve it from a snapshot listener
+        db_manager.watch_market_state()
     except Exception as e:
         st.error(f"Failed to initialize application: {e}")
         st.info("Please check your database and authentication configuration.")
@@ -155,7 +227,7 @@ def main():
                 )
             
             if interface_type == "📊 Instructor Dashboard":
-                instructor_dashboard = InstructorDashboard()
+                instructor_dashboard = get_instructor_dashboard()
                 instructor_dashboard.show_dashboard()
             else:
                 # Show student interface for testing
@@ -192,9 +264,9 @@ def show_student_interface(username, db_manager, auth_manager):
 def show_dashboard(team_id: str, db_manager: FirestoreManager):
     st.header("📊 Airline Dashboard")
     
-    # Get airline state
-    airline_state = db_manager.get_airline_state(team_id)
-    market_state = db_manager.get_market_state()
+    # Get airline and market state in one round trip
+    airline_state, market_state = cached_airline_and_market_state(team_id)
+    remember_airline_state(airline_state)
     
     if not airline_state:
         st.error("Airline data not found. Please contact administrator.")
@@ -226,12 +298,11 @@ def show_dashboard(team_id: str, db_manager: FirestoreManager):
         st.write(f"**Active Routes:** {len(airline_state.routes)}")
         if airline_state.routes:
             st.write("**Route List:**")
-            for route in airline_state.routes:
-                st.write(f"- {route}")
+            st.markdown("\n".join(f"- {route}" for route in airline_state.routes))
         else:
             st.write("No active routes")
         
-        st.write(f"**Last Updated:** {airline_state.last_updated.strftime('%Y-%m-%d %H:%M')}")
+        st.write(f"**Last Updated:** {airline_state.last_updated.isoformat(sep=' ', timespec='minutes')}")
     
     with col2:
         st.subheader("🌍 Market Conditions")
@@ -242,16 +313,68 @@ def show_dashboard(team_id: str, db_manager: FirestoreManager):
             
             if market_state.events:
                 st.write("**Recent Market Events:**")
-                for event in market_state.events[-3:]:  # Show last 3 events
-                    st.write(f"- {event}")
+                # Show last 3 events
+                st.markdown("\n".join(f"- {event}" for event in market_state.events[-3:]))
         else:
             st.warning("Market data not available")
 
 
+def _action_input(i: int, max_cash: int) -> Optional[AirlineAction]:
+    """Render the widgets for one manual plan action; returns None while incomplete"""
+    st.write(f"**Action {i+1}**")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        action_type = st.selectbox(
+            f"Action Type {i+1}",
+            ["purchase_aircraft", "add_route", "marketing_campaign", 
+             "staff_training", "maintenance_upgrade"],
+            key=f"action_type_{i}"
+        )
+        
+        description = st.text_input(
+            f"Description {i+1}",
+            key=f"description_{i}",
+            placeholder="Describe this action..."
+        )
+    
+    with col2:
+        cost = st.number_input(
+            f"Cost {i+1}",
+            min_value=0,
+            max_value=max_cash,
+            value=0,
+            key=f"cost_{i}"
+        )
+        
+        # Action-specific parameters
+        parameters = {}
+        if action_type == "purchase_aircraft":
+            aircraft_count = st.number_input(f"Aircraft Count {i+1}", min_value=1, value=1, key=f"aircraft_{i}")
+            parameters = {"count": aircraft_count}
+        elif action_type == "add_route":
+            route = st.text_input(f"Route {i+1}", key=f"route_{i}", placeholder="e.g., PRG-LHR")
+            parameters = {"route": route}
+        elif action_type == "marketing_campaign":
+            reputation_impact = st.slider(f"Reputation Impact {i+1}", 1, 10, 5, key=f"reputation_{i}")
+            parameters = {"reputation_impact": reputation_impact}
+    
+    if description and cost > 0:
+        return AirlineAction(
+            action_type=action_type,
+            description=description,
+            cost=float(cost),
+            parameters=parameters
+        )
+    return None
+
+
+# Runs as a fragment so submitting the form reruns only this page, not main()
+@st.fragment
 def show_plan_submission(team_id: str, db_manager: FirestoreManager):
     st.header("📋 Submit Semester Plan")
     
-    airline_state = db_manager.get_airline_state(team_id)
+    airline_state = session_airline_state(team_id)
     if not airline_state:
         st.error("Airline data not found.")
         return
@@ -275,60 +398,19 @@ def show_plan_submission(team_id: str, db_manager: FirestoreManager):
         num_actions = st.number_input("Number of Actions", min_value=1, max_value=10, value=3)
         
         # Initialize collections for form data
-        actions_data = []
+        actions = []
         total_cost = 0
         
         # Convert airline cash to int to avoid mixed numeric types
         max_cash = int(airline_state.cash)
         
         for i in range(num_actions):
-            st.write(f"**Action {i+1}**")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                action_type = st.selectbox(
-                    f"Action Type {i+1}",
-                    ["purchase_aircraft", "add_route", "marketing_campaign", 
-                     "staff_training", "maintenance_upgrade"],
-                    key=f"action_type_{i}"
-                )
-                
-                description = st.text_input(
-                    f"Description {i+1}",
-                    key=f"description_{i}",
-                    placeholder="Describe this action..."
-                )
-            
-            with col2:
-                cost = st.number_input(
-                    f"Cost {i+1}",
-                    min_value=0,
-                    max_value=max_cash,
-                    value=0,
-                    key=f"cost_{i}"
-                )
-                
-                # Action-specific parameters
-                parameters = {}
-                if action_type == "purchase_aircraft":
-                    aircraft_count = st.number_input(f"Aircraft Count {i+1}", min_value=1, value=1, key=f"aircraft_{i}")
-                    parameters = {"count": aircraft_count}
-                elif action_type == "add_route":
-                    route = st.text_input(f"Route {i+1}", key=f"route_{i}", placeholder="e.g., PRG-LHR")
-                    parameters = {"route": route}
-                elif action_type == "marketing_campaign":
-                    reputation_impact = st.slider(f"Reputation Impact {i+1}", 1, 10, 5, key=f"reputation_{i}")
-                    parameters = {"reputation_impact": reputation_impact}
+            action = _action_input(i, max_cash)
             
-            # Store action data for processing after form submission
-            if description and cost > 0:
-                actions_data.append({
-                    'action_type': action_type,
-                    'description': description,
-                    'cost': cost,
-                    'parameters': parameters
-                })
-                total_cost += cost
+            # Store action for processing after form submission
+            if action:
+                actions.append(action)
+                total_cost += action.cost
         
         st.write(f"**Total Plan Cost: ${total_cost:,.0f}**")
         
@@ -338,56 +420,51 @@ def show_plan_submission(team_id: str, db_manager: FirestoreManager):
         submitted = st.form_submit_button("Submit Plan")
         
         if submitted:
-            plan_data = None
+            plan = None
+            submitted_at = datetime.now()
             
             # Process uploaded file
             if uploaded_file:
                 try:
-                    plan_data = json.load(uploaded_file)
-                except json.JSONDecodeError:
+                    # getvalue() hands the raw bytes straight to the parser
+                    plan_data = json_utils.loads(uploaded_file.getvalue())
+                except json_utils.JSONDecodeError:
                     st.error("Invalid JSON file")
                     return
-            
-            # Process manual entry
-            elif actions_data:
-                # Convert actions_data to AirlineAction objects
-                actions = []
-                for action_data in actions_data:
-                    action = AirlineAction(
-                        action_type=action_data['action_type'],
-                        description=action_data['description'],
-                        cost=float(action_data['cost']),
-                        parameters=action_data['parameters']
-                    )
-                    actions.append(action)
                 
-                plan_data = {
-                    "team_id": team_id,
-                    "semester": semester,
-                    "actions": [action.model_dump() for action in actions],
-                    "total_budget": total_cost,
-                    "submission_timestamp": datetime.now().isoformat()
-                }
-            
-            if plan_data:
                 try:
-                    # Create SemesterPlan object
+                    # Uploaded actions are plain dicts; SemesterPlan validates them
                     plan = SemesterPlan(
                         team_id=team_id,
                         semester=semester,
-                        actions=[AirlineAction(**action) for action in plan_data["actions"]],
+                        actions=plan_data["actions"],
                         total_budget=plan_data["total_budget"],
-                        submission_timestamp=datetime.now()
+                        submission_timestamp=submitted_at
                     )
-                    
+                except Exception as e:
+                    st.error(f"Error creating plan: {str(e)}")
+                    return
+            
+            # Process manual entry
+            elif actions:
+                # Actions were validated as they were entered, so skip re-validation
+                plan = SemesterPlan.model_construct(
+                    team_id=team_id,
+                    semester=semester,
+                    actions=actions,
+                    total_budget=float(total_cost),
+                    submission_timestamp=submitted_at
+                )
+            
+            if plan:
+                try:
                     # Save plan
                     if db_manager.save_semester_plan(plan):
                         st.success("Plan submitted successfully!")
                         
-                        # Process plan through workflow
-                        workflow = SimulationWorkflow()
+                        # Process plan through workflow, batched with concurrent submissions
                         try:
-                            results = workflow.process_semester_plans([plan])
+                            results = get_plan_batcher().submit(plan).result()
                             st.success("Plan processed successfully!")
                             
                             # Show results
@@ -404,6 +481,9 @@ def show_plan_submission(team_id: str, db_manager: FirestoreManager):
                         
                         except Exception as e:
                             st.error(f"Error processing plan: {str(e)}")
+                        
+                        # Workflow wrote new airline/market state
+                        clear_cached_state()
                     
                     else:
                         st.error("Failed to save plan")
@@ -414,11 +494,32 @@ def show_plan_submission(team_id: str, db_manager: FirestoreManager):
                 st.warning("Please upload a file or create a manual plan")
 
 
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS)
+def build_airline_table(snapshot: Tuple[Tuple, ...]):
+    """Airline comparison table and market-share series, keyed on a hashable snapshot.
+    
+    Each snapshot row is (team_id, market_share, reputation, aircraft, routes, cash).
+    """
+    import pandas as pd  # deferred: only the market analysis page builds DataFrames
+    
+    team_ids, market_shares, reputations, aircraft, routes, cash = (list(column) for column in zip(*snapshot))
+    
+    # Values stay numeric so the table sorts correctly
+    df = pd.DataFrame({
+        "Team": team_ids,
+        "Market Share": market_shares,
+        "Reputation": reputations,
+        "Aircraft": aircraft,
+        "Routes": routes,
+        "Cash": cash
+    })
+    return df, pd.Series(market_shares, index=team_ids)
+
+
 def show_market_analysis(db_manager: FirestoreManager):
     st.header("📈 Market Analysis")
     
-    market_state = db_manager.get_market_state()
-    all_airlines = db_manager.get_all_airline_states()
+    all_airlines, market_state = cached_all_airline_and_market_states()
     
     if not market_state:
         st.warning("Market data not available")
@@ -436,8 +537,7 @@ def show_market_analysis(db_manager: FirestoreManager):
     with col2:
         st.subheader("Recent Events")
         if market_state.events:
-            for event in market_state.events:
-                st.write(f"• {event}")
+            st.markdown("\n".join(f"- {event}" for event in market_state.events))
         else:
             st.write("No recent events")
     
@@ -445,25 +545,21 @@ def show_market_analysis(db_manager: FirestoreManager):
     if all_airlines:
         st.subheader("Airline Performance")
         
-        df_data = []
-        for airline in all_airlines:
-            df_data.append({
-                "Team": airline.team_id,
-                "Market Share": f"{airline.market_share:.2%}",
-                "Reputation": airline.reputation,
-                "Aircraft": airline.aircraft_count,
-                "Routes": len(airline.routes),
-                "Cash": f"${airline.cash:,.0f}"
-            })
-        
-        df = pd.DataFrame(df_data)
-        st.dataframe(df, use_container_width=True)
+        snapshot = tuple(
+            (airline.team_id, airline.market_share, airline.reputation,
+             airline.aircraft_count, len(airline.routes), airline.cash)
+            for airline in all_airlines
+        )
+        df, market_share_series = build_airline_table(snapshot)
+        st.dataframe(
+            df.style.format({"Market Share": "{:.2%}", "Cash": "${:,.0f}"}),
+            use_container_width=True
+        )
         
         # Market share chart
         if len(all_airlines) > 1:
             st.subheader("Market Share Distribution")
-            market_share_data = {airline.team_id: airline.market_share for airline in all_airlines}
-            st.bar_chart(market_share_data)
+            st.bar_chart(market_share_series)
 
 
 def show_feedback_history(team_id: str, db_manager: FirestoreManager):
@@ -1,36 +1,129 @@
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Annotated
+from typing import TypedDict, List, Optional, Set, TYPE_CHECKING
 from typing_extensions import TypedDict
-import operator
-import litellm
+from collections import OrderedDict
 from datetime import datetime
+import threading
+import time
 
 from ..models import SemesterPlan, AirlineState, AirlineAction, AgentResponse
-from ..database import FirestoreManager
+from ..database import get_firestore_manager
 from ..config import Config
+from ..llm_cache import cached_completion
 from ..observability import trace_company_agent
 
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
+
+# Action types that each tie up an aircraft
+AIRCRAFT_INTENSIVE_ACTIONS = frozenset({"add_route", "increase_frequency"})
+
+# Feasibility check per action type; unknown action types are feasible
+ACTION_FEASIBILITY = {
+    "purchase_aircraft": lambda state: True,  # Can always buy aircraft if budget allows
+    "add_route": lambda state: state.aircraft_count > len(state.routes),
+    "marketing_campaign": lambda state: True,  # Can always do marketing
+    "staff_training": lambda state: True,  # Can always train staff
+    "maintenance_upgrade": lambda state: state.aircraft_count > 0,
+}
+
+AI_VALIDATION_TIMEOUT_SECONDS = 30
+
+# Recent assessments by prompt: (time fetched, text), oldest first
+_AI_VALIDATION_CACHE_MAX_ENTRIES = 256
+_ai_validation_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_ai_validation_cache_lock = threading.Lock()
+
+# AirlineState fields process_plan can change; keep in sync with _apply_action_to_state
+PLAN_UPDATED_FIELDS = frozenset({"cash", "aircraft_count", "routes", "reputation", "last_updated"})
+
+VALIDATION_PROMPT_TEMPLATE = """
+        Analyze this airline's semester plan for strategic coherence and feasibility:
+        
+        Airline State:
+        - Cash: ${cash:,}
+        - Aircraft: {aircraft_count}
+        - Current Routes: {routes_block}
+        - Market Share: {market_share:.2%}
+        - Reputation: {reputation}/100
+        
+        Proposed Actions:
+        {actions_block}
+        
+        Total Budget: ${total_budget:,}
+        
+        Provide a brief assessment of:
+        1. Strategic coherence
+        2. Risk factors
+        3. Feasibility concerns
+        
+        Keep response under 200 words.
+        """
+
+def _ai_validate(prompt: str) -> str:
+    """Strategic assessment for a validation prompt.
+    
+    The prompt embeds the airline state and every action, so an unchanged
+    resubmission within CACHE_TTL_SECONDS reuses the last assessment instead
+    of sampling a new one. The request itself times out after
+    AI_VALIDATION_TIMEOUT_SECONDS, so a slow call can't outlive the plan it
+    validates.
+    """
+    with _ai_validation_cache_lock:
+        entry = _ai_validation_cache.get(prompt)
+        if entry is not None and time.monotonic() - entry[0] < Config.CACHE_TTL_SECONDS:
+            _ai_validation_cache.move_to_end(prompt)
+            return entry[1]
+    
+    assessment = cached_completion(
+        model="gemini/gemini-pro",
+        messages=[{"role": "user", "content": prompt}],
+        api_key=Config.GEMINI_API_KEY,
+        timeout=AI_VALIDATION_TIMEOUT_SECONDS
+    )
+    
+    with _ai_validation_cache_lock:
+        _ai_validation_cache[prompt] = (time.monotonic(), assessment)
+        _ai_validation_cache.move_to_end(prompt)
+        while len(_ai_validation_cache) > _AI_VALIDATION_CACHE_MAX_ENTRIES:
+            _ai_validation_cache.popitem(last=False)
+    return assessment
+
+
+# Nodes return the full state, so every key is plain last-value; list reducers
+# would concatenate each node's output onto the previous value
 class CompanyAgentState(TypedDict):
     plan: SemesterPlan
     airline_state: AirlineState
-    approved_actions: Annotated[List[AirlineAction], operator.add]
-    rejected_actions: Annotated[List[AirlineAction], operator.add]
-    validation_messages: Annotated[List[str], operator.add]
+    approved_actions: List[AirlineAction]
+    rejected_actions: List[AirlineAction]
+    validation_messages: List[str]
     cash_used: float
 
 
 class CompanyAgent:
+    # Compiled graph shared by all instances; the nodes hold no per-agent state
+    _compiled_graph = None
+    
     def __init__(self):
-        self.db = FirestoreManager()
-        self.graph = self._build_graph()
+        self.db = get_firestore_manager()
+        self.graph = self._get_graph()
+    
+    @classmethod
+    def _get_graph(cls):
+        if cls._compiled_graph is None:
+            cls._compiled_graph = cls._build_graph()
+        return cls._compiled_graph
     
-    def _build_graph(self) -> StateGraph:
+    @classmethod
+    def _build_graph(cls) -> "StateGraph":
+        from langgraph.graph import StateGraph, END
+        
         workflow = StateGraph(CompanyAgentState)
         
         # Add nodes
-        workflow.add_node("validator", self._validator_node)
-        workflow.add_node("implementer", self._implementer_node)
+        workflow.add_node("validator", cls._validator_node)
+        workflow.add_node("implementer", cls._implementer_node)
         
         # Add edges
         workflow.set_entry_point("validator")
@@ -39,12 +132,36 @@ class CompanyAgent:
         
         return workflow.compile()
     
-    def _validator_node(self, state: CompanyAgentState) -> CompanyAgentState:
+    @staticmethod
+    def _validator_node(state: CompanyAgentState) -> CompanyAgentState:
         plan = state["plan"]
         airline_state = state["airline_state"]
         
+        # Use AI to validate strategic coherence
+        actions_block = "\n        ".join(
+            f"- {action.action_type}: {action.description} (${action.cost:,.0f})"
+            for action in plan.actions
+        )
+        routes_block = ", ".join(airline_state.routes) or "None"
+        validation_prompt = VALIDATION_PROMPT_TEMPLATE.format_map({
+            "cash": airline_state.cash,
+            "aircraft_count": airline_state.aircraft_count,
+            "routes_block": routes_block,
+            "market_share": airline_state.market_share,
+            "reputation": airline_state.reputation,
+            "actions_block": actions_block,
+            "total_budget": plan.total_budget,
+        })
+        
+        # Single pass over the plan for budget and capacity figures
+        total_cost = 0.0
+        aircraft_intensive_count = 0
+        for action in plan.actions:
+            total_cost += action.cost
+            if action.action_type in AIRCRAFT_INTENSIVE_ACTIONS:
+                aircraft_intensive_count += 1
+        
         # Validate budget constraints
-        total_cost = sum(action.cost for action in plan.actions)
         if total_cost > airline_state.cash:
             over_budget = total_cost - airline_state.cash
             state["validation_messages"].append(
@@ -52,48 +169,15 @@ class CompanyAgent:
             )
         
         # Validate capacity constraints
-        aircraft_intensive_actions = [
-            action for action in plan.actions 
-            if action.action_type in ["add_route", "increase_frequency"]
-        ]
-        
-        if len(aircraft_intensive_actions) > airline_state.aircraft_count:
+        if aircraft_intensive_count > airline_state.aircraft_count:
             state["validation_messages"].append(
-                f"Insufficient aircraft for route operations. Available: {airline_state.aircraft_count}, Required: {len(aircraft_intensive_actions)}"
+                f"Insufficient aircraft for route operations. Available: {airline_state.aircraft_count}, Required: {aircraft_intensive_count}"
             )
         
-        # Use AI to validate strategic coherence
-        validation_prompt = f"""
-        Analyze this airline's semester plan for strategic coherence and feasibility:
-        
-        Airline State:
-        - Cash: ${airline_state.cash:,}
-        - Aircraft: {airline_state.aircraft_count}
-        - Current Routes: {airline_state.routes}
-        - Market Share: {airline_state.market_share:.2%}
-        - Reputation: {airline_state.reputation}/100
-        
-        Proposed Actions:
-        {[f"- {action.action_type}: {action.description} (${action.cost:,})" for action in plan.actions]}
-        
-        Total Budget: ${plan.total_budget:,}
-        
-        Provide a brief assessment of:
-        1. Strategic coherence
-        2. Risk factors
-        3. Feasibility concerns
-        
-        Keep response under 200 words.
-        """
-        
+        # Called inline: the workflow already validates each team's plan on its own
+        # thread, and a pool here would queue calls behind other teams' timeouts
         try:
-            response = litellm.completion(
-                model="gemini/gemini-pro",
-                messages=[{"role": "user", "content": validation_prompt}],
-                api_key=Config.GEMINI_API_KEY
-            )
-            
-            ai_validation = response.choices[0].message.content
+            ai_validation = _ai_validate(validation_prompt)
             state["validation_messages"].append(f"AI Strategic Assessment: {ai_validation}")
             
         except Exception as e:
@@ -101,7 +185,8 @@ class CompanyAgent:
         
         return state
     
-    def _implementer_node(self, state: CompanyAgentState) -> CompanyAgentState:
+    @staticmethod
+    def _implementer_node(state: CompanyAgentState) -> CompanyAgentState:
         plan = state["plan"]
         airline_state = state["airline_state"]
         available_cash = airline_state.cash
@@ -113,14 +198,25 @@ class CompanyAgent:
         approved_actions = []
         rejected_actions = []
         
-        for action in sorted_actions:
-            if cash_used + action.cost <= available_cash:
-                # Additional feasibility checks
-                if self._is_action_feasible(action, airline_state):
-                    approved_actions.append(action)
-                    cash_used += action.cost
-                else:
-                    rejected_actions.append(action)
+        # The airline state is fixed for this pass, so feasibility depends only
+        # on the action type; check each type once
+        feasible_by_type = {}
+        
+        for index, action in enumerate(sorted_actions):
+            if cash_used + action.cost > available_cash:
+                # Costs are ascending, so none of the remaining actions fit either
+                rejected_actions.extend(sorted_actions[index:])
+                break
+            
+            # Additional feasibility checks
+            feasible = feasible_by_type.get(action.action_type)
+            if feasible is None:
+                feasible = CompanyAgent._is_action_feasible(action, airline_state)
+                feasible_by_type[action.action_type] = feasible
+            
+            if feasible:
+                approved_actions.append(action)
+                cash_used += action.cost
             else:
                 rejected_actions.append(action)
         
@@ -130,23 +226,10 @@ class CompanyAgent:
         
         return state
     
-    def _is_action_feasible(self, action: AirlineAction, airline_state: AirlineState) -> bool:
-        if action.action_type == "purchase_aircraft":
-            return True  # Can always buy aircraft if budget allows
-        
-        elif action.action_type == "add_route":
-            return airline_state.aircraft_count > len(airline_state.routes)
-        
-        elif action.action_type == "marketing_campaign":
-            return True  # Can always do marketing
-        
-        elif action.action_type == "staff_training":
-            return True  # Can always train staff
-        
-        elif action.action_type == "maintenance_upgrade":
-            return airline_state.aircraft_count > 0
-        
-        return True  # Default to feasible
+    @staticmethod
+    def _is_action_feasible(action: AirlineAction, airline_state: AirlineState) -> bool:
+        check = ACTION_FEASIBILITY.get(action.action_type)
+        return check(airline_state) if check else True
     
     @trace_company_agent
     def process_plan(self, plan: SemesterPlan, team_id: str) -> AgentResponse:
@@ -167,17 +250,18 @@ class CompanyAgent:
         # Run the graph
         result = self.graph.invoke(initial_state)
         
-        # Update airline state
-        updated_airline = airline_state.model_copy()
-        updated_airline.cash -= result["cash_used"]
-        updated_airline.last_updated = datetime.now()
+        # Update airline state in place; it was fetched for this call only and
+        # the graph is done with it
+        airline_state.cash -= result["cash_used"]
+        airline_state.last_updated = datetime.now()
         
-        # Apply approved actions to airline state
+        # Apply approved actions to airline state, sharing one route set across them
+        known_routes = set(airline_state.routes)
         for action in result["approved_actions"]:
-            self._apply_action_to_state(action, updated_airline)
+            self._apply_action_to_state(action, airline_state, known_routes)
         
-        # Save updated state
-        self.db.update_airline_state(updated_airline)
+        # Save only the fields a plan can change
+        self.db.update_airline_state_partial(team_id, airline_state.model_dump(include=PLAN_UPDATED_FIELDS))
         
         return AgentResponse(
             approved_actions=result["approved_actions"],
@@ -186,15 +270,23 @@ class CompanyAgent:
             reasoning="\n".join(result["validation_messages"])
         )
     
-    def _apply_action_to_state(self, action: AirlineAction, airline_state: AirlineState):
+    def _apply_action_to_state(
+        self,
+        action: AirlineAction,
+        airline_state: AirlineState,
+        known_routes: Optional[Set[str]] = None
+    ):
         if action.action_type == "purchase_aircraft":
             count = action.parameters.get("count", 1)
             airline_state.aircraft_count += count
         
         elif action.action_type == "add_route":
             route = action.parameters.get("route")
-            if route and route not in airline_state.routes:
+            if known_routes is None:
+                known_routes = set(airline_state.routes)
+            if route and route not in known_routes:
                 airline_state.routes.append(route)
+                known_routes.add(route)
         
         elif action.action_type == "marketing_campaign":
             reputation_boost = action.parameters.get("reputation_impact", 5)
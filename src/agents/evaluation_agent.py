@@ -1,16 +1,118 @@
-import litellm
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import re
 
 from ..models import AirlineState, MarketState, EvaluationFeedback, SemesterPlan, AgentResponse
-from ..database import FirestoreManager
+from ..database import get_firestore_manager
+from .. import json_utils
 from ..config import Config
+from ..llm_cache import cached_completion
 from ..observability import trace_evaluation_agent
 
+logger = logging.getLogger(__name__)
+
+# Batched evaluation requests are independent network calls, so they run concurrently
+_ai_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="evaluation-ai")
+
+# Outermost {...} span of an AI response, which should hold its JSON payload
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+# Outermost [...] span of a batched AI response, which should hold its JSON array
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+_SCORE_RE = re.compile(r'score[:\s]*(\d+)', re.IGNORECASE)
+# Substrings _simple_text_parsing maps to strengths and improvement areas
+_FEEDBACK_KEYWORD_RE = re.compile(r'good|strong|coherent|realistic|improve|budget|over|exceed|risk', re.IGNORECASE)
+
+# The evaluation prompt is split so that only the middle part is formatted per
+# call; the static prefix stays identical for provider-side prompt caching
+EVALUATION_PROMPT_HEADER = """
+        You are an expert business strategy evaluator for an airline simulation game. 
+        Provide comprehensive feedback on a student team's strategic implementation.
+        
+"""
+
+EVALUATION_PROMPT_TEAM = """        TEAM SUBMISSION:
+        Team: {team_id}
+        Semester: {semester}
+        Proposed Budget: ${total_budget:,}
+        
+        PROPOSED ACTIONS:
+        {actions_block}
+        
+        COMPANY AGENT RESULTS:
+        Approved Actions: {approved_count}
+        Rejected Actions: {rejected_count}
+        Cash Used: ${cash_used:,}
+        Approval Rate: {approval_rate:.1%}
+        Budget Utilization: {budget_efficiency:.1%}
+        
+        Reasoning: {reasoning}
+        
+        CURRENT AIRLINE STATE:
+        - Cash Available: ${cash:,}
+        - Aircraft Fleet: {aircraft_count}
+        - Active Routes: {route_count} ({route_sample}...)
+        - Market Share: {market_share:.2%}
+        - Reputation: {reputation}/100
+        
+"""
+
+EVALUATION_PROMPT_MARKET = """        MARKET CONDITIONS:
+        - Economic Conditions: {economic_conditions}
+        - Competition Level: {competition_level:.2f}
+        - Recent Events: {events}
+        
+"""
+
+EVALUATION_PROMPT_BODY = EVALUATION_PROMPT_TEAM + EVALUATION_PROMPT_MARKET
+
+# The answer format and criteria, shared by single and batched evaluations
+EVALUATION_PROMPT_RUBRIC = """        {
+            "score": 0-100,
+            "feedback_text": "Detailed paragraph explaining performance...",
+            "strengths": ["strength1", "strength2", "strength3"],
+            "improvement_areas": ["area1", "area2", "area3"],
+            "strategic_assessment": {
+                "planning_quality": 0-10,
+                "resource_allocation": 0-10,
+                "market_awareness": 0-10,
+                "execution_feasibility": 0-10
+            },
+            "recommendations": ["recommendation1", "recommendation2"]
+        }
+        
+        EVALUATION CRITERIA:
+        1. Strategic Coherence (25%): Do actions align with airline's situation and market conditions?
+        2. Resource Management (25%): Efficient use of budget and assets?
+        3. Market Awareness (25%): Understanding of competitive landscape and opportunities?
+        4. Implementation Feasibility (25%): Realistic and executable plans?
+        
+        Be constructive, specific, and educational. This is formative feedback for student learning.
+        """
+
+EVALUATION_PROMPT_FOOTER = (
+    "        Please provide your evaluation in the following JSON format:\n" + EVALUATION_PROMPT_RUBRIC
+)
+
+# A batched prompt states the market once, then every team's submission
+BATCH_EVALUATION_PROMPT_INTRO = """        Evaluate each of the {team_count} team submissions below on its own merits.
+        All teams compete in the same market:
+        
+"""
+
+BATCH_EVALUATION_PROMPT_FOOTER = (
+    "        Please provide your evaluations as a JSON array with one object per team, each holding\n"
+    "        the team's \"team_id\" plus the fields of the following JSON format:\n" + EVALUATION_PROMPT_RUBRIC
+)
+
+# Teams per batched evaluation request, so each answer stays well inside the output limit
+EVALUATION_BATCH_SIZE = 8
+
 
 class EvaluationAgent:
     def __init__(self):
-        self.db = FirestoreManager()
+        self.db = get_firestore_manager()
     
     @trace_evaluation_agent
     def evaluate_team_performance(
@@ -27,20 +129,23 @@ class EvaluationAgent:
         if not airline_state:
             raise ValueError(f"Airline state not found for team {team_id}")
         
+        # Shared by the AI prompt and the fallback evaluation
+        approval_rate, budget_efficiency = self._plan_ratios(plan, company_response)
+        now = datetime.now()
+        
         # Generate comprehensive evaluation
         evaluation_prompt = self._build_evaluation_prompt(
-            plan, company_response, airline_state, market_state, market_results
+            plan, company_response, airline_state, market_state, market_results,
+            approval_rate, budget_efficiency
         )
         
         try:
-            response = litellm.completion(
+            ai_feedback = cached_completion(
                 model="gemini/gemini-pro",
                 messages=[{"role": "user", "content": evaluation_prompt}],
                 api_key=Config.GEMINI_API_KEY
             )
             
-            ai_feedback = response.choices[0].message.content
-            
             # Parse AI response and calculate score
             parsed_feedback = self._parse_ai_feedback(ai_feedback)
             
@@ -50,7 +155,7 @@ class EvaluationAgent:
                 feedback_text=parsed_feedback["feedback_text"],
                 strengths=parsed_feedback["strengths"],
                 improvement_areas=parsed_feedback["improvement_areas"],
-                created_at=datetime.now()
+                created_at=now
             )
             
             # Save feedback to database
@@ -61,129 +166,215 @@ class EvaluationAgent:
         except Exception as e:
             # Fallback evaluation if AI fails
             return self._generate_fallback_evaluation(
-                team_id, plan, company_response, airline_state
+                team_id, plan, company_response, airline_state,
+                approval_rate, budget_efficiency, now
             )
     
+    @trace_evaluation_agent
+    def evaluate_batch(
+        self,
+        submissions: List[Tuple[SemesterPlan, AgentResponse]],
+        market_results: Dict[str, Any]
+    ) -> Dict[str, EvaluationFeedback]:
+        """Evaluate several teams with one AI request per EVALUATION_BATCH_SIZE of them.
+        
+        Returns feedback by team_id for the teams the batched answers covered.
+        Teams left out (no airline state, a failed request, an unusable answer)
+        are for the caller to evaluate one by one with evaluate_team_performance.
+        """
+        airline_states = self.db.get_airline_states([plan.team_id for plan, _ in submissions])
+        market_state = self.db.get_market_state()
+        if not market_state:
+            return {}
+        
+        now = datetime.now()
+        evaluable = [
+            (plan, company_response, airline_states[plan.team_id])
+            for plan, company_response in submissions
+            if plan.team_id in airline_states
+        ]
+        chunk_futures = [
+            _ai_executor.submit(self._evaluate_chunk, evaluable[start:start + EVALUATION_BATCH_SIZE], market_state, now)
+            for start in range(0, len(evaluable), EVALUATION_BATCH_SIZE)
+        ]
+        
+        feedbacks = {}
+        for future in chunk_futures:
+            try:
+                feedbacks.update(future.result())
+            except Exception:
+                logger.exception("Error in batched evaluation request")
+        
+        if feedbacks:
+            self.db.save_evaluation_feedbacks(list(feedbacks.values()))
+        return feedbacks
+    
+    def _evaluate_chunk(
+        self,
+        submissions: List[Tuple[SemesterPlan, AgentResponse, AirlineState]],
+        market_state: MarketState,
+        now: datetime
+    ) -> Dict[str, EvaluationFeedback]:
+        ai_feedback = cached_completion(
+            model="gemini/gemini-pro",
+            messages=[{"role": "user", "content": self._build_batch_evaluation_prompt(submissions, market_state)}],
+            api_key=Config.GEMINI_API_KEY
+        )
+        return self._parse_batch_feedback(ai_feedback, [plan.team_id for plan, _, _ in submissions], now)
+    
     def _build_evaluation_prompt(
         self,
         plan: SemesterPlan,
         company_response: AgentResponse,
         airline_state: AirlineState,
         market_state: MarketState,
-        market_results: Dict[str, Any]
+        market_results: Dict[str, Any],
+        approval_rate: float,
+        budget_efficiency: float
     ) -> str:
         
-        return f"""
-        You are an expert business strategy evaluator for an airline simulation game. 
-        Provide comprehensive feedback on a student team's strategic implementation.
-        
-        TEAM SUBMISSION:
-        Team: {plan.team_id}
-        Semester: {plan.semester}
-        Proposed Budget: ${plan.total_budget:,}
-        
-        PROPOSED ACTIONS:
-        {self._format_actions(plan.actions)}
-        
-        COMPANY AGENT RESULTS:
-        Approved Actions: {len(company_response.approved_actions)}
-        Rejected Actions: {len(company_response.rejected_actions)}
-        Cash Used: ${company_response.cash_used:,}
-        
-        Reasoning: {company_response.reasoning}
-        
-        CURRENT AIRLINE STATE:
-        - Cash Available: ${airline_state.cash:,}
-        - Aircraft Fleet: {airline_state.aircraft_count}
-        - Active Routes: {len(airline_state.routes)} ({', '.join(airline_state.routes[:3])}...)
-        - Market Share: {airline_state.market_share:.2%}
-        - Reputation: {airline_state.reputation}/100
-        
-        MARKET CONDITIONS:
-        - Economic Conditions: {market_state.economic_conditions}
-        - Competition Level: {market_state.competition_level:.2f}
-        - Recent Events: {', '.join(market_state.events)}
-        
-        Please provide your evaluation in the following JSON format:
-        {{
-            "score": 0-100,
-            "feedback_text": "Detailed paragraph explaining performance...",
-            "strengths": ["strength1", "strength2", "strength3"],
-            "improvement_areas": ["area1", "area2", "area3"],
-            "strategic_assessment": {{
-                "planning_quality": 0-10,
-                "resource_allocation": 0-10,
-                "market_awareness": 0-10,
-                "execution_feasibility": 0-10
-            }},
-            "recommendations": ["recommendation1", "recommendation2"]
-        }}
-        
-        EVALUATION CRITERIA:
-        1. Strategic Coherence (25%): Do actions align with airline's situation and market conditions?
-        2. Resource Management (25%): Efficient use of budget and assets?
-        3. Market Awareness (25%): Understanding of competitive landscape and opportunities?
-        4. Implementation Feasibility (25%): Realistic and executable plans?
-        
-        Be constructive, specific, and educational. This is formative feedback for student learning.
-        """
+        return EVALUATION_PROMPT_HEADER + EVALUATION_PROMPT_BODY.format(
+            **self._team_prompt_fields(plan, company_response, airline_state, approval_rate, budget_efficiency),
+            **self._market_prompt_fields(market_state)
+        ) + EVALUATION_PROMPT_FOOTER
+    
+    def _build_batch_evaluation_prompt(
+        self,
+        submissions: List[Tuple[SemesterPlan, AgentResponse, AirlineState]],
+        market_state: MarketState
+    ) -> str:
+        team_blocks = [
+            EVALUATION_PROMPT_TEAM.format(**self._team_prompt_fields(
+                plan, company_response, airline_state, *self._plan_ratios(plan, company_response)
+            ))
+            for plan, company_response, airline_state in submissions
+        ]
+        return (
+            EVALUATION_PROMPT_HEADER
+            + BATCH_EVALUATION_PROMPT_INTRO.format(team_count=len(submissions))
+            + EVALUATION_PROMPT_MARKET.format(**self._market_prompt_fields(market_state))
+            + "".join(team_blocks)
+            + BATCH_EVALUATION_PROMPT_FOOTER
+        )
+    
+    def _team_prompt_fields(
+        self,
+        plan: SemesterPlan,
+        company_response: AgentResponse,
+        airline_state: AirlineState,
+        approval_rate: float,
+        budget_efficiency: float
+    ) -> Dict[str, Any]:
+        return {
+            "team_id": plan.team_id,
+            "semester": plan.semester,
+            "total_budget": plan.total_budget,
+            "actions_block": self._format_actions(plan.actions),
+            "approved_count": len(company_response.approved_actions),
+            "rejected_count": len(company_response.rejected_actions),
+            "cash_used": company_response.cash_used,
+            "approval_rate": approval_rate,
+            "budget_efficiency": budget_efficiency,
+            "reasoning": company_response.reasoning,
+            "cash": airline_state.cash,
+            "aircraft_count": airline_state.aircraft_count,
+            "route_count": len(airline_state.routes),
+            "route_sample": ', '.join(airline_state.routes[:3]),
+            "market_share": airline_state.market_share,
+            "reputation": airline_state.reputation
+        }
+    
+    @staticmethod
+    def _market_prompt_fields(market_state: MarketState) -> Dict[str, Any]:
+        return {
+            "economic_conditions": market_state.economic_conditions,
+            "competition_level": market_state.competition_level,
+            "events": ', '.join(market_state.events)
+        }
     
     def _format_actions(self, actions) -> str:
-        formatted = []
-        for i, action in enumerate(actions, 1):
-            formatted.append(
-                f"{i}. {action.action_type}: {action.description} (${action.cost:,})"
-            )
-        return "\n".join(formatted)
+        return "\n".join(
+            f"{i}. {action.action_type}: {action.description} (${action.cost:,})"
+            for i, action in enumerate(actions, 1)
+        )
     
     def _parse_ai_feedback(self, ai_response: str) -> Dict[str, Any]:
         try:
             # Simple parsing - in production, use proper JSON parsing with error handling
-            import json
-            import re
-            
             # Extract JSON from response
-            json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
+            json_match = _JSON_RE.search(ai_response)
             if json_match:
                 json_str = json_match.group()
-                parsed = json.loads(json_str)
+                parsed = json_utils.loads(json_str)
                 
-                return {
-                    "score": min(100, max(0, parsed.get("score", 50))),
-                    "feedback_text": parsed.get("feedback_text", "No detailed feedback available."),
-                    "strengths": parsed.get("strengths", ["Strategic thinking"]),
-                    "improvement_areas": parsed.get("improvement_areas", ["Resource planning"])
-                }
+                return self._feedback_fields(parsed)
             else:
                 # Fallback parsing if JSON not found
                 return self._simple_text_parsing(ai_response)
                 
-        except Exception as e:
-            print(f"Error parsing AI feedback: {e}")
+        except Exception:
+            logger.exception("Error parsing AI feedback")
             return self._simple_text_parsing(ai_response)
     
+    def _parse_batch_feedback(
+        self, ai_response: str, team_ids: List[str], now: datetime
+    ) -> Dict[str, EvaluationFeedback]:
+        """Validated feedback per team from a batched answer; teams it lacks or garbles are left out"""
+        json_match = _JSON_ARRAY_RE.search(ai_response)
+        if not json_match:
+            return {}
+        try:
+            items = json_utils.loads(json_match.group())
+        except ValueError:
+            logger.exception("Error parsing batched AI feedback")
+            return {}
+        
+        feedback = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict) or item.get("team_id") not in team_ids:
+                continue
+            # Validated per item, so one malformed entry only sends that team to the per-team path
+            try:
+                feedback[item["team_id"]] = EvaluationFeedback(
+                    team_id=item["team_id"], created_at=now, **self._feedback_fields(item)
+                )
+            except Exception:
+                logger.exception("Error parsing batched AI feedback for team %s", item["team_id"])
+        return feedback
+    
+    @staticmethod
+    def _feedback_fields(parsed: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "score": min(100, max(0, parsed.get("score", 50))),
+            "feedback_text": parsed.get("feedback_text", "No detailed feedback available."),
+            "strengths": parsed.get("strengths", ["Strategic thinking"]),
+            "improvement_areas": parsed.get("improvement_areas", ["Resource planning"])
+        }
+    
     def _simple_text_parsing(self, text: str) -> Dict[str, Any]:
         # Extract score if mentioned
-        import re
-        score_match = re.search(r'score[:\s]*(\d+)', text, re.IGNORECASE)
+        score_match = _SCORE_RE.search(text)
         score = int(score_match.group(1)) if score_match else 75
         
         # Basic strengths and weaknesses extraction
         strengths = []
         improvement_areas = []
         
-        if "good" in text.lower() or "strong" in text.lower():
+        # One scan for every keyword instead of a lower() and search per check
+        found = {match.group().lower() for match in _FEEDBACK_KEYWORD_RE.finditer(text)}
+        
+        if found & {"good", "strong"}:
             strengths.append("Strategic execution")
-        if "coherent" in text.lower():
+        if "coherent" in found:
             strengths.append("Plan coherence")
-        if "realistic" in text.lower():
+        if "realistic" in found:
             strengths.append("Realistic planning")
             
-        if "improve" in text.lower():
+        if "improve" in found:
             improvement_areas.append("Strategic refinement")
-        if "budget" in text.lower() and ("over" in text.lower() or "exceed" in text.lower()):
+        if "budget" in found and found & {"over", "exceed"}:
             improvement_areas.append("Budget management")
-        if "risk" in text.lower():
+        if "risk" in found:
             improvement_areas.append("Risk assessment")
         
         return {
@@ -193,18 +384,25 @@ class EvaluationAgent:
             "improvement_areas": improvement_areas if improvement_areas else ["Implementation planning"]
         }
     
+    @staticmethod
+    def _plan_ratios(plan: SemesterPlan, company_response: AgentResponse) -> Tuple[float, float]:
+        """(approval rate, budget efficiency) of a processed plan"""
+        approval_rate = len(company_response.approved_actions) / len(plan.actions) if plan.actions else 0
+        budget_efficiency = company_response.cash_used / plan.total_budget if plan.total_budget > 0 else 0
+        return approval_rate, budget_efficiency
+    
     def _generate_fallback_evaluation(
         self,
         team_id: str,
         plan: SemesterPlan,
         company_response: AgentResponse,
-        airline_state: AirlineState
+        airline_state: AirlineState,
+        approval_rate: float,
+        budget_efficiency: float,
+        now: datetime
     ) -> EvaluationFeedback:
         
         # Basic scoring based on approval rate and budget usage
-        approval_rate = len(company_response.approved_actions) / len(plan.actions) if plan.actions else 0
-        budget_efficiency = company_response.cash_used / plan.total_budget if plan.total_budget > 0 else 0
-        
         base_score = (approval_rate * 50) + (budget_efficiency * 30) + 20  # Base 20 points
         score = min(100, max(0, int(base_score)))
         
@@ -239,34 +437,25 @@ class EvaluationAgent:
             feedback_text=feedback_text.strip(),
             strengths=strengths if strengths else ["Strategic initiative"],
             improvement_areas=improvement_areas if improvement_areas else ["Strategic alignment"],
-            created_at=datetime.now()
+            created_at=now
         )
     
     def generate_instructor_summary(self) -> Dict[str, Any]:
-        all_airlines = self.db.get_all_airline_states()
+        # One aggregate document instead of reading every airline
+        market_distribution = self.db.get_airline_summary()
         
-        if not all_airlines:
+        if not market_distribution:
             return {"message": "No airline data available"}
         
         # Calculate class statistics
         scores = []  # Would need to get recent evaluation scores
-        market_shares = [airline.market_share for airline in all_airlines]
-        reputations = [airline.reputation for airline in all_airlines]
-        
+        team_count = len(market_distribution)
         summary = {
-            "total_teams": len(all_airlines),
-            "market_distribution": {
-                airline.team_id: {
-                    "market_share": airline.market_share,
-                    "reputation": airline.reputation,
-                    "aircraft_count": airline.aircraft_count,
-                    "cash": airline.cash
-                }
-                for airline in all_airlines
-            },
+            "total_teams": team_count,
+            "market_distribution": market_distribution,
             "class_averages": {
-                "reputation": sum(reputations) / len(reputations) if reputations else 0,
-                "market_share": sum(market_shares) / len(market_shares) if market_shares else 0
+                "reputation": sum(team["reputation"] for team in market_distribution.values()) / team_count,
+                "market_share": sum(team["market_share"] for team in market_distribution.values()) / team_count
             }
         }
         
@@ -1,20 +1,71 @@
-import litellm
 from typing import List, Dict, Any
 from datetime import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import random
+import re
 
 from ..models import AirlineState, MarketState, AgentResponse
-from ..database import FirestoreManager
+from ..database import get_firestore_manager
 from ..config import Config
+from ..llm_cache import cached_completion
 from ..observability import trace_market_agent
 
+logger = logging.getLogger(__name__)
+
+# Per-airline AI evaluations are independent network calls, so they run concurrently
+_ai_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="market-ai")
+
+# The AI is asked for a single "reputation_change=<int>" line; the JSON form
+# ("reputation_change": <int>) is still accepted in case it answers that way
+_REPUTATION_CHANGE_RE = re.compile(r'"?reputation_change"?\s*[=:]\s*\+?(-?\d+)')
+# That answer is a handful of tokens, so don't pay for a long completion
+MARKET_AI_MAX_TOKENS = 32
+
+# Event wording that pushes economic conditions down or up
+NEGATIVE_EVENT_KEYWORDS = ("recession", "crisis", "strike", "disruption", "tax")
+POSITIVE_EVENT_KEYWORDS = ("boom", "growth", "opportunity", "efficiency", "upgrade")
+
+ECONOMIC_EVENTS = (
+    "Fuel prices increased by 15% due to geopolitical tensions",
+    "Tourism boom increases passenger demand by 20%",
+    "Economic recession reduces business travel by 25%",
+    "New airport opens, creating expansion opportunities",
+    "Government introduces new aviation taxes"
+)
+
+COMPETITION_EVENTS = (
+    "New low-cost carrier enters the market",
+    "Major competitor files for bankruptcy",
+    "International airline alliance forms",
+    "Price war initiated by market leader",
+    "New regulatory restrictions on routes"
+)
+
+OPERATIONAL_EVENTS = (
+    "Air traffic control strikes cause delays",
+    "Weather disruptions affect 30% of flights",
+    "New safety regulations require aircraft modifications",
+    "Pilot shortage affects industry capacity",
+    "Technology upgrade improves efficiency"
+)
+
+# (events, probability per tick), drawn in this order
+MARKET_EVENT_CATEGORIES = (
+    (ECONOMIC_EVENTS, 0.3),
+    (COMPETITION_EVENTS, 0.25),
+    (OPERATIONAL_EVENTS, 0.2),
+)
+
 
 class MarketAgent:
     def __init__(self):
-        self.db = FirestoreManager()
+        self.db = get_firestore_manager()
     
     @trace_market_agent
     def evaluate_market_performance(self, all_responses: List[AgentResponse]) -> Dict[str, Any]:
+        # One timestamp for everything this tick updates
+        now = datetime.now()
         all_airlines = self.db.get_all_airline_states()
         current_market = self.db.get_market_state()
         
@@ -24,23 +75,28 @@ class MarketAgent:
                 competition_level=0.5,
                 economic_conditions="stable",
                 events=[],
-                last_updated=datetime.now()
+                last_updated=now
             )
         
         # Calculate market dynamics
         market_analysis = self._analyze_market_competition(all_airlines)
         
+        # Start every airline's AI evaluation before the local work below
+        ai_futures = [
+            _ai_executor.submit(self._ai_performance_evaluation, airline, current_market, market_analysis)
+            for airline in all_airlines
+        ]
+        
         # Generate market events
         new_events = self._generate_market_events(current_market, all_airlines)
         
         # Update airline performance based on actions
         updated_airlines = []
-        for airline in all_airlines:
+        for airline, ai_future in zip(all_airlines, ai_futures):
             updated_airline = self._calculate_airline_performance(
-                airline, all_airlines, current_market, market_analysis
+                airline, all_airlines, current_market, market_analysis, ai_future.result(), now
             )
             updated_airlines.append(updated_airline)
-            self.db.update_airline_state(updated_airline)
         
         # Update market state
         updated_market = MarketState(
@@ -48,10 +104,11 @@ class MarketAgent:
             competition_level=market_analysis["competition_intensity"],
             economic_conditions=self._determine_economic_conditions(new_events),
             events=new_events,
-            last_updated=datetime.now()
+            last_updated=now
         )
         
-        self.db.update_market_state(updated_market)
+        # One atomic write for every airline plus the market
+        self.db.batch_update_airline_states(updated_airlines, updated_market)
         
         return {
             "market_state": updated_market,
@@ -68,13 +125,16 @@ class MarketAgent:
                 "average_reputation": 50.0
             }
         
-        total_aircraft = sum(airline.aircraft_count for airline in airlines)
-        total_routes = len(set().union(*[airline.routes for airline in airlines]))
-        market_shares = [airline.market_share for airline in airlines]
-        reputations = [airline.reputation for airline in airlines]
-        
-        # Calculate Herfindahl-Hirschman Index for market concentration
-        hhi = sum(share ** 2 for share in market_shares) if market_shares else 0
+        # Single pass over the airlines for every aggregate
+        total_aircraft = 0
+        distinct_routes = set()
+        hhi = 0.0  # Herfindahl-Hirschman Index for market concentration
+        total_reputation = 0.0
+        for airline in airlines:
+            total_aircraft += airline.aircraft_count
+            distinct_routes.update(airline.routes)
+            hhi += airline.market_share ** 2
+            total_reputation += airline.reputation
         
         competition_intensity = min(1.0, total_aircraft / 20)  # Normalize to 0-1
         
@@ -82,45 +142,17 @@ class MarketAgent:
             "competition_intensity": competition_intensity,
             "market_concentration": hhi,
             "total_capacity": total_aircraft,
-            "total_routes": total_routes,
-            "average_reputation": sum(reputations) / len(reputations) if reputations else 50.0
+            "total_routes": len(distinct_routes),
+            "average_reputation": total_reputation / len(airlines)
         }
     
     def _generate_market_events(self, current_market: MarketState, airlines: List[AirlineState]) -> List[str]:
         events = []
         
-        # Economic events (30% probability)
-        if random.random() < 0.3:
-            economic_events = [
-                "Fuel prices increased by 15% due to geopolitical tensions",
-                "Tourism boom increases passenger demand by 20%", 
-                "Economic recession reduces business travel by 25%",
-                "New airport opens, creating expansion opportunities",
-                "Government introduces new aviation taxes"
-            ]
-            events.append(random.choice(economic_events))
-        
-        # Competition events (25% probability)
-        if random.random() < 0.25:
-            competition_events = [
-                "New low-cost carrier enters the market",
-                "Major competitor files for bankruptcy",
-                "International airline alliance forms",
-                "Price war initiated by market leader",
-                "New regulatory restrictions on routes"
-            ]
-            events.append(random.choice(competition_events))
-        
-        # Operational events (20% probability)
-        if random.random() < 0.2:
-            operational_events = [
-                "Air traffic control strikes cause delays",
-                "Weather disruptions affect 30% of flights",
-                "New safety regulations require aircraft modifications",
-                "Pilot shortage affects industry capacity",
-                "Technology upgrade improves efficiency"
-            ]
-            events.append(random.choice(operational_events))
+        # At most one event per category, each drawn with its own probability
+        for category_events, probability in MARKET_EVENT_CATEGORIES:
+            if random.random() < probability:
+                events.append(random.choice(category_events))
         
         return events
     
@@ -129,10 +161,13 @@ class MarketAgent:
         airline: AirlineState, 
         all_airlines: List[AirlineState],
         market_state: MarketState,
-        market_analysis: Dict[str, Any]
+        market_analysis: Dict[str, Any],
+        performance_analysis: Dict[str, Any],
+        now: datetime
     ) -> AirlineState:
         
-        updated_airline = airline.model_copy()
+        new_share = airline.market_share
+        new_reputation = airline.reputation
         
         # Calculate market share based on capacity and reputation
         total_capacity = market_analysis["total_capacity"]
@@ -142,21 +177,19 @@ class MarketAgent:
             
             # Market share influenced by capacity and reputation
             base_share = capacity_share * reputation_factor
-            updated_airline.market_share = min(1.0, base_share * (1 + random.uniform(-0.1, 0.1)))
+            new_share = min(1.0, base_share * (1 + random.uniform(-0.1, 0.1)))
         
-        # Use AI to evaluate strategic performance
-        performance_analysis = self._ai_performance_evaluation(
-            airline, market_state, market_analysis
-        )
-        
-        # Apply performance adjustments
+        # Apply the AI's strategic performance adjustments
         if "reputation_change" in performance_analysis:
             reputation_delta = performance_analysis["reputation_change"]
-            updated_airline.reputation = max(0, min(100, 
-                updated_airline.reputation + reputation_delta
-            ))
+            new_reputation = max(0, min(100, new_reputation + reputation_delta))
         
-        updated_airline.last_updated = datetime.now()
+        # One copy with every change applied, rather than a copy and three setattrs
+        updated_airline = airline.model_copy(update={
+            "market_share": new_share,
+            "reputation": new_reputation,
+            "last_updated": now
+        })
         
         return updated_airline
     
@@ -187,36 +220,29 @@ class MarketAgent:
         - Competition Intensity: {market_analysis['competition_intensity']:.2f}
         - Average Reputation: {market_analysis['average_reputation']:.1f}
         
-        Provide a JSON response with:
-        {{
-            "reputation_change": -5 to +5,
-            "performance_rating": "poor|average|good|excellent",
-            "key_factors": ["factor1", "factor2"]
-        }}
+        Decide the airline's reputation change, an integer from -5 to +5.
+        Output only: reputation_change=<int>
         """
         
         try:
-            response = litellm.completion(
+            content = cached_completion(
                 model="gemini/gemini-pro",
                 messages=[{"role": "user", "content": evaluation_prompt}],
-                api_key=Config.GEMINI_API_KEY
+                api_key=Config.GEMINI_API_KEY,
+                max_tokens=MARKET_AI_MAX_TOKENS,
+                temperature=0
             )
             
-            # Parse AI response (simplified - in production, use proper JSON parsing)
-            content = response.choices[0].message.content
-            
             # Extract reputation change (simple regex-like approach)
-            if "reputation_change" in content:
-                import re
-                match = re.search(r'"reputation_change":\s*(-?\d+)', content)
-                if match:
-                    reputation_change = int(match.group(1))
-                    return {"reputation_change": max(-5, min(5, reputation_change))}
+            match = _REPUTATION_CHANGE_RE.search(content)
+            if match:
+                reputation_change = int(match.group(1))
+                return {"reputation_change": max(-5, min(5, reputation_change))}
             
             return {"reputation_change": 0}
             
-        except Exception as e:
-            print(f"AI evaluation failed: {e}")
+        except Exception:
+            logger.exception("AI evaluation failed")
             return {"reputation_change": 0}
     
     def _calculate_total_demand(self, market_analysis: Dict[str, Any], current_market: MarketState) -> int:
@@ -233,16 +259,13 @@ class MarketAgent:
         return max(800000, min(1500000, new_demand))  # Keep within reasonable bounds
     
     def _determine_economic_conditions(self, events: List[str]) -> str:
-        negative_keywords = ["recession", "crisis", "strike", "disruption", "tax"]
-        positive_keywords = ["boom", "growth", "opportunity", "efficiency", "upgrade"]
+        lowered_events = [event.lower() for event in events]
         
-        negative_count = sum(1 for event in events 
-                           for keyword in negative_keywords 
-                           if keyword in event.lower())
+        negative_count = sum(any(keyword in event for keyword in NEGATIVE_EVENT_KEYWORDS)
+                             for event in lowered_events)
         
-        positive_count = sum(1 for event in events
-                           for keyword in positive_keywords
-                           if keyword in event.lower())
+        positive_count = sum(any(keyword in event for keyword in POSITIVE_EVENT_KEYWORDS)
+                             for event in lowered_events)
         
         if positive_count > negative_count:
             return "growing"
@@ -1,99 +1,129 @@
 import streamlit_authenticator as stauth
 import yaml
-from yaml.loader import SafeLoader
+try:
+    from yaml import CSafeLoader as SafeLoader  # LibYAML-backed, same safety rules
+except ImportError:
+    from yaml.loader import SafeLoader
 from typing import Dict, Optional
 import streamlit as st
-from datetime import datetime
+from functools import cached_property
+import hashlib
+import logging
+from pathlib import Path
 
+from . import json_utils
 from .config import Config
-from .database import FirestoreManager
-from .models import AirlineState
-from .user_management import UserManager
+from .database import get_firestore_manager, new_airline_state
+from .user_management import get_user_manager
+
+logger = logging.getLogger(__name__)
+
+
+# Local credentials file at the repository root
+_CREDENTIALS_PATH = Path(__file__).resolve().parent.parent / 'credentials.yaml'
+
+# Fallback accounts for testing; both use the password "secret"
+_TEST_PASSWORD_HASH = '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW'
+_TEST_USERS = {
+    'team1': {
+        'email': 'team1@university.edu',
+        'name': 'Team 1',
+        'password': _TEST_PASSWORD_HASH
+    },
+    'admin': {
+        'email': 'admin@university.edu',
+        'name': 'Administrator',
+        'password': _TEST_PASSWORD_HASH
+    }
+}
+
+
+def _cookie_config() -> Dict:
+    return {
+        'name': Config.STREAMLIT_AUTH_COOKIE_NAME,
+        'key': Config.STREAMLIT_AUTH_COOKIE_KEY,
+        'expiry_days': Config.STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS
+    }
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS)
+def _load_auth_config() -> Dict:
+    """Authenticator config, loaded once per TTL instead of on every rerun.
+    
+    st.cache_data hands each caller its own copy, so the authenticator is
+    free to update the credentials dict for its session.
+    """
+    # Try multiple credential sources in order of preference
+    config = None
+    
+    # 1. Try Firestore-based credentials (production)
+    try:
+        user_manager = get_user_manager()
+        firestore_users = user_manager.get_all_users()
+        if firestore_users:
+            logger.debug("Loaded %s users from Firestore", len(firestore_users))
+            config = {
+                'credentials': {
+                    'usernames': firestore_users
+                },
+                'cookie': _cookie_config(),
+                'preauthorized': []
+            }
+    except Exception as e:
+        logger.debug("Could not load Firestore credentials: %s", e)
+    
+    # 2. Try local credentials file
+    if not config:
+        try:
+            if _CREDENTIALS_PATH.is_file():
+                # Binary mode lets the LibYAML loader read the bytes directly
+                with _CREDENTIALS_PATH.open('rb') as file:
+                    config = yaml.load(file, Loader=SafeLoader)
+                    config['cookie'].update(_cookie_config())
+                    logger.debug("Loaded credentials from local file")
+        except Exception as e:
+            logger.debug("Could not load credentials file: %s", e)
+    
+    # 3. Fallback to hardcoded credentials for testing
+    if not config:
+        logger.debug("Using hardcoded test credentials")
+        config = {
+            'credentials': {
+                'usernames': _TEST_USERS
+            },
+            'cookie': _cookie_config(),
+            'preauthorized': []
+        }
+    
+    return config
 
 
 class AuthManager:
     def __init__(self):
-        self.db = FirestoreManager()
         self.authenticator = None
         self._setup_authenticator()
     
+    @cached_property
+    def db(self):
+        # Only needed for first-login airline setup, so don't connect before then
+        return get_firestore_manager()
+    
     def _setup_authenticator(self):
-        import streamlit_authenticator as stauth
-        import yaml
-        import os
-        
-        print("DEBUG: Setting up authenticator")
-        
-        # Try multiple credential sources in order of preference
-        config = None
-        
-        # 1. Try Firestore-based credentials (production)
-        try:
-            user_manager = UserManager()
-            firestore_users = user_manager.get_all_users()
-            if firestore_users:
-                print(f"DEBUG: Loaded {len(firestore_users)} users from Firestore")
-                config = {
-                    'credentials': {
-                        'usernames': firestore_users
-                    },
-                    'cookie': {
-                        'name': Config.STREAMLIT_AUTH_COOKIE_NAME,
-                        'key': Config.STREAMLIT_AUTH_COOKIE_KEY,
-                        'expiry_days': Config.STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS
-                    },
-                    'preauthorized': []
-                }
-        except Exception as e:
-            print(f"DEBUG: Could not load Firestore credentials: {e}")
-        
-        # 2. Try local credentials file
-        if not config:
-            credentials_path = os.path.join(os.path.dirname(__file__), '..', 'credentials.yaml')
-            try:
-                if os.path.exists(credentials_path):
-                    with open(credentials_path, 'r') as file:
-                        config = yaml.safe_load(file)
-                        config['cookie']['name'] = Config.STREAMLIT_AUTH_COOKIE_NAME
-                        config['cookie']['key'] = Config.STREAMLIT_AUTH_COOKIE_KEY
-                        config['cookie']['expiry_days'] = Config.STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS
-                        print("DEBUG: Loaded credentials from local file")
-            except Exception as e:
-                print(f"DEBUG: Could not load credentials file: {e}")
+        logger.debug("Setting up authenticator")
+        config = _load_auth_config()
         
-        # 3. Fallback to hardcoded credentials for testing
-        if not config:
-            print("DEBUG: Using hardcoded test credentials")
-            
-            # For now, let's use a simple known password
-            password_hash = '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW'  # "secret"
-            
-            config = {
-                'credentials': {
-                    'usernames': {
-                        'team1': {
-                            'email': 'team1@university.edu',
-                            'name': 'Team 1',
-                            'password': password_hash
-                        },
-                        'admin': {
-                            'email': 'admin@university.edu',
-                            'name': 'Administrator',
-                            'password': password_hash
-                        }
-                    }
-                },
-                'cookie': {
-                    'name': Config.STREAMLIT_AUTH_COOKIE_NAME,
-                    'key': Config.STREAMLIT_AUTH_COOKIE_KEY,
-                    'expiry_days': Config.STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS
-                },
-                'preauthorized': []
-            }
+        # Reuse this session's authenticator across reruns while the credentials are unchanged
+        config_hash = hashlib.blake2b(
+            json_utils.dumps([config['credentials'], config['cookie']], sort_keys=True),
+            digest_size=16
+        ).hexdigest()
+        if st.session_state.get('_auth_config_hash') == config_hash and '_authenticator' in st.session_state:
+            self.authenticator = st.session_state['_authenticator']
+            return
         
         # Debug: Show loaded usernames
         usernames = list(config['credentials']['usernames'].keys())
-        print(f"DEBUG: Loaded usernames: {usernames}")
+        logger.debug("Loaded usernames: %s", usernames)
         
         self.authenticator = stauth.Authenticate(
             config['credentials'],
@@ -101,35 +131,37 @@ class AuthManager:
             config['cookie']['key'],
             config['cookie']['expiry_days']
         )
-        print("DEBUG: Authenticator created successfully")
+        st.session_state['_auth_config_hash'] = config_hash
+        st.session_state['_authenticator'] = self.authenticator
+        logger.debug("Authenticator created successfully")
     
     def login(self) -> tuple[Optional[str], Optional[str], Optional[bool]]:
         """
         Returns: (name, authentication_status, username)
         """
         try:
-            print("DEBUG: Calling authenticator.login()")
+            logger.debug("Calling authenticator.login()")
             result = self.authenticator.login(location='main')
-            print(f"DEBUG: Login result: {result}")
+            logger.debug("Login result: %s", result)
             
             if result is None:
-                print("DEBUG: Login returned None")
+                logger.debug("Login returned None")
                 return None, None, None
             
             name, authentication_status, username = result
-            print(f"DEBUG: Parsed login - name: {name}, status: {authentication_status}, username: {username}")
+            logger.debug("Parsed login - name: %s, status: %s, username: %s", name, authentication_status, username)
             
             if authentication_status:
-                print(f"DEBUG: Login successful for {username}")
+                logger.debug("Login successful for %s", username)
                 self._ensure_airline_exists(username)
             elif authentication_status is False:
-                print("DEBUG: Login failed - invalid credentials")
+                logger.debug("Login failed - invalid credentials")
             else:
-                print("DEBUG: Login status is None - waiting for input")
+                logger.debug("Login status is None - waiting for input")
             
             return name, authentication_status, username
         except Exception as e:
-            print(f"DEBUG: Authentication error: {e}")
+            logger.exception("Authentication error")
             st.error(f"Authentication error: {e}")
             return None, None, None
     
@@ -137,20 +169,9 @@ class AuthManager:
         self.authenticator.logout(location='main')
     
     def _ensure_airline_exists(self, team_id: str):
-        existing_airline = self.db.get_airline_state(team_id)
-        
-        if not existing_airline:
-            default_airline = AirlineState(
-                team_id=team_id,
-                name=f"Airline {team_id.upper()}",
-                cash=Config.MAX_SEMESTER_BUDGET,
-                aircraft_count=0,
-                routes=[],
-                market_share=0.0,
-                reputation=50.0,
-                last_updated=datetime.now()
-            )
-            self.db.update_airline_state(default_airline)
+        # Checked and created in a single write; repeat logins cost no Firestore I/O
+        default_airline = new_airline_state(team_id, f"Airline {team_id.upper()}")
+        self.db.create_airline_if_missing(default_airline)
     
     def get_current_user(self) -> Optional[str]:
         if 'username' in st.session_state:
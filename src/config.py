@@ -1,13 +1,28 @@
 import os
+import functools
+from typing import Any, Dict
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+@functools.lru_cache(maxsize=1)
+def get_streamlit_secrets() -> Dict[str, Any]:
+    """Streamlit secrets as a plain dict, read once per process (empty if none)"""
+    try:
+        import streamlit as st
+        return dict(st.secrets) if st.secrets else {}
+    except Exception:
+        # No secrets.toml, or not running under Streamlit
+        return {}
+
+
 class Config:
     # Google Cloud / Firestore
     GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     FIRESTORE_PROJECT_ID = os.getenv("FIRESTORE_PROJECT_ID")
+    # Firestore clients (each with its own gRPC channel) that calls are spread across
+    FIRESTORE_POOL_SIZE = int(os.getenv("FIRESTORE_POOL_SIZE", "1"))
     
     # AI API Configuration
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -21,24 +36,33 @@ class Config:
     STREAMLIT_AUTH_COOKIE_KEY = os.getenv("STREAMLIT_AUTH_COOKIE_KEY", "default-dev-key-change-in-production")
     STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS = int(os.getenv("STREAMLIT_AUTH_COOKIE_EXPIRY_DAYS", "30"))
     
+    # Logging (use DEBUG to see auth and Firestore setup details)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
+    
     # Simulation Settings
     MAX_SEMESTER_BUDGET = 1000000  # Default budget per semester
     
+    # Caching (seconds cached Firestore reads stay fresh across Streamlit reruns)
+    CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30"))
+    # On-disk cache of LLM responses; set to an empty string to disable
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache/llm")
+    
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def validate_required_config(cls):
-        """Validate that required configuration is present"""
+        """Validate that required configuration is present (a pass is remembered; failures re-check)"""
         # Try to get from streamlit secrets if environment variables are missing
-        import streamlit as st
+        secrets = get_streamlit_secrets()
         
         firestore_id = cls.FIRESTORE_PROJECT_ID
         gemini_key = cls.GEMINI_API_KEY
         
         # Fallback to direct secrets access if env vars are empty
-        if not firestore_id and hasattr(st, 'secrets') and 'FIRESTORE_PROJECT_ID' in st.secrets:
-            firestore_id = st.secrets['FIRESTORE_PROJECT_ID']
+        if not firestore_id and 'FIRESTORE_PROJECT_ID' in secrets:
+            firestore_id = secrets['FIRESTORE_PROJECT_ID']
             
-        if not gemini_key and hasattr(st, 'secrets') and 'GEMINI_API_KEY' in st.secrets:
-            gemini_key = st.secrets['GEMINI_API_KEY']
+        if not gemini_key and 'GEMINI_API_KEY' in secrets:
+            gemini_key = secrets['GEMINI_API_KEY']
         
         required_vars = {
             "FIRESTORE_PROJECT_ID": firestore_id,
@@ -2,79 +2,302 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud import firestore as firestore_client
 from google.oauth2 import service_account
-from typing import Optional, Dict, Any, List
+from google.api_core.exceptions import AlreadyExists, NotFound
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from datetime import datetime
-import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import functools
+import itertools
+import logging
+import threading
+import time
 
-from .config import Config
+from .config import Config, get_streamlit_secrets
 from .models import AirlineState, MarketState, SemesterPlan, EvaluationFeedback
 
+logger = logging.getLogger(__name__)
+
+# Process-wide read cache shared by every FirestoreManager instance, so the
+# agents in one simulation run don't each re-read the same documents.
+# Maps (method name, *args) -> (monotonic timestamp, value), oldest first.
+_READ_CACHE_MAX_ENTRIES = 256
+_read_cache: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+_read_cache_lock = threading.Lock()
+# Keys with a background refresh in flight (see _stale_while_revalidate_read)
+_refreshing_reads = set()
+# Invalidation counters, bumped by _invalidate_reads per method name (or per full
+# key for an args-scoped invalidation); a read that started before a bump must
+# not store its now out-of-date result
+_read_generations: Dict[Any, int] = {}
+# Names of the methods behind every cached read, registered by the decorators
+_CACHED_READ_METHODS = set()
+
+
+def _cached_read(method):
+    """Serve a read from the cache while younger than CACHE_TTL_SECONDS.
+    
+    Callers get deep copies, since agents update the returned models in place.
+    Empty results are not cached: the read methods also return those on error.
+    """
+    _CACHED_READ_METHODS.add(method.__name__)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__,) + args + tuple(sorted(kwargs.items()))
+        with _read_cache_lock:
+            entry = _read_cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < Config.CACHE_TTL_SECONDS:
+                _read_cache.move_to_end(key)
+                return copy.deepcopy(entry[1])
+            generation = _read_generation(key)
+        
+        value = method(self, *args, **kwargs)
+        if not value or value == (None, None):
+            return value
+        
+        _store_read(key, value, generation)
+        return value
+    return wrapper
+
+
+def _stale_while_revalidate_read(method):
+    """Like _cached_read, but a stale entry is still served while it refreshes.
+    
+    The refresh runs in the background; if it fails the stale value stays
+    in place. Writes invalidate the entry as usual, so the next read after
+    one of our own writes is always fresh.
+    """
+    _CACHED_READ_METHODS.add(method.__name__)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__,) + args + tuple(sorted(kwargs.items()))
+        start_refresh = False
+        with _read_cache_lock:
+            generation = _read_generation(key)
+            entry = _read_cache.get(key)
+            if entry is not None:
+                _read_cache.move_to_end(key)
+                if time.monotonic() - entry[0] >= Config.CACHE_TTL_SECONDS and key not in _refreshing_reads:
+                    _refreshing_reads.add(key)
+                    start_refresh = True
+                value = copy.deepcopy(entry[1])
+        
+        if entry is not None:
+            if start_refresh:
+                _read_executor.submit(_refresh_read, key, generation, method, self, args, kwargs)
+            return value
+        
+        value = method(self, *args, **kwargs)
+        if value:
+            _store_read(key, value, generation)
+        return value
+    return wrapper
+
+
+def _refresh_read(key: tuple, generation: tuple, method, manager, args: tuple, kwargs: Dict[str, Any]):
+    try:
+        value = method(manager, *args, **kwargs)
+        if value:
+            _store_read(key, value, generation)
+    finally:
+        with _read_cache_lock:
+            _refreshing_reads.discard(key)
+
+
+def _read_generation(key: tuple) -> tuple:
+    """Invalidation state of `key`, taken when a read starts; caller holds _read_cache_lock"""
+    return (_read_generations.get(key[0], 0), _read_generations.get(key, 0))
+
+
+def _current_read_generation(key: tuple) -> tuple:
+    with _read_cache_lock:
+        return _read_generation(key)
+
+
+def _store_read(key: tuple, value: Any, generation: tuple):
+    """Cache a read's result, unless `key` was invalidated since the read began"""
+    with _read_cache_lock:
+        if _read_generation(key) != generation:
+            return
+        _read_cache[key] = (time.monotonic(), copy.deepcopy(value))
+        _read_cache.move_to_end(key)
+        while len(_read_cache) > _READ_CACHE_MAX_ENTRIES:
+            _read_cache.popitem(last=False)
+
+
+def _invalidate_reads(*method_names: str, args: Optional[tuple] = None):
+    """Drop cached results of the given read methods, only for `args` if given"""
+    with _read_cache_lock:
+        for method_name in method_names:
+            counter = method_name if args is None else (method_name,) + args
+            _read_generations[counter] = _read_generations.get(counter, 0) + 1
+        stale = [
+            key for key in _read_cache
+            if key[0] in method_names and (args is None or key[1:] == args)
+        ]
+        for key in stale:
+            del _read_cache[key]
+
+
+@functools.lru_cache(maxsize=1)
+def _firestore_settings() -> Tuple[str, Any]:
+    """Pick a credential source, once per process: the (project, credentials) every client is built from.
+    
+    Failures raise and are not cached, so the next FirestoreManager retries.
+    """
+    try:
+        import os
+        
+        # Debug info
+        logger.debug("Initializing Firestore with project_id: %s", Config.FIRESTORE_PROJECT_ID)
+        logger.debug("GOOGLE_APPLICATION_CREDENTIALS path: %s", Config.GOOGLE_APPLICATION_CREDENTIALS)
+        
+        # Set GOOGLE_CLOUD_PROJECT environment variable as backup
+        os.environ['GOOGLE_CLOUD_PROJECT'] = Config.FIRESTORE_PROJECT_ID
+        logger.debug("Set GOOGLE_CLOUD_PROJECT to: %s", Config.FIRESTORE_PROJECT_ID)
+        
+        # Try direct approach with service account from Streamlit secrets
+        secrets = get_streamlit_secrets()
+        if 'gcp_service_account' in secrets:
+            logger.debug("Using direct service account from Streamlit secrets")
+            
+            # Create credentials directly from secrets
+            service_account_info = dict(secrets['gcp_service_account'])
+            credentials_obj = service_account.Credentials.from_service_account_info(service_account_info)
+            logger.debug("Firestore credentials loaded from secrets")
+            return Config.FIRESTORE_PROJECT_ID, credentials_obj
+        
+        # Fallback to firebase-admin approach
+        if not firebase_admin._apps:
+            if Config.GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(Config.GOOGLE_APPLICATION_CREDENTIALS):
+                logger.debug("Using service account credentials file")
+                cred = credentials.Certificate(Config.GOOGLE_APPLICATION_CREDENTIALS)
+                firebase_admin.initialize_app(cred, {
+                    'projectId': Config.FIRESTORE_PROJECT_ID,
+                })
+            else:
+                logger.debug("Using default credentials with explicit project")
+                # For Streamlit Cloud, we need to explicitly set the project
+                firebase_admin.initialize_app(options={
+                    'projectId': Config.FIRESTORE_PROJECT_ID,
+                })
+        
+        # The same project and credentials firebase-admin's firestore.client() would use
+        app = firebase_admin.get_app()
+        logger.debug("Firestore credentials loaded via firebase-admin")
+        return app.project_id, app.credential.get_credential()
+        
+    except Exception as e:
+        print(f"Error initializing Firestore: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+
+@functools.lru_cache(maxsize=1)
+def _firestore_client_pool() -> List[Any]:
+    """Config.FIRESTORE_POOL_SIZE clients (at least one), all built from the same project and credentials.
+    
+    Every Client opens its own gRPC channel, so concurrent workflow calls
+    spread across them rather than queueing on a single connection.
+    """
+    project, credentials_obj = _firestore_settings()
+    return [
+        firestore_client.Client(project=project, credentials=credentials_obj)
+        for _ in range(max(1, Config.FIRESTORE_POOL_SIZE))
+    ]
+
+
+# Runs independent reads side by side; the sync client has no async fan-out
+_read_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="firestore-read")
+
+
+# Firestore rejects batches with more writes than this
+FIRESTORE_BATCH_LIMIT = 500
+
+# AirlineState fields copied into the simulation/airline_summary document; each
+# entry also carries route_count, so list views never need the routes themselves
+AIRLINE_SUMMARY_FIELDS = ("name", "market_share", "reputation", "aircraft_count", "cash")
+_SUMMARY_ENTRY_KEYS = frozenset(AIRLINE_SUMMARY_FIELDS) | {"route_count"}
+
+
+def _summary_entry(airline_state: AirlineState) -> Dict[str, Any]:
+    entry = {field: getattr(airline_state, field) for field in AIRLINE_SUMMARY_FIELDS}
+    entry['route_count'] = len(airline_state.routes)
+    return entry
+
+
+def _summary_update(airline_states: List[AirlineState]) -> Dict[str, Any]:
+    """Summary document body for the given airlines, for a set(..., merge=True)"""
+    return {'teams': {airline_state.team_id: _summary_entry(airline_state) for airline_state in airline_states}}
+
+
+def _write_data(state) -> Dict[str, Any]:
+    """model_dump() of an airline or market state for writing, with last_updated stamped by Firestore"""
+    data = state.model_dump()
+    data['last_updated'] = firestore.SERVER_TIMESTAMP
+    return data
+
+
+# Starting figures every new airline shares; routes is given a fresh list per airline
+_NEW_AIRLINE_DEFAULTS = {
+    'cash': float(Config.MAX_SEMESTER_BUDGET),
+    'aircraft_count': 0,
+    'market_share': 0.0,
+    'reputation': 50.0,
+}
+
+
+def new_airline_state(team_id: str, name: str) -> AirlineState:
+    """A new team's starting AirlineState, built from constant defaults without validation.
+    
+    last_updated is only a placeholder; writes stamp it with SERVER_TIMESTAMP.
+    """
+    return AirlineState.model_construct(
+        team_id=team_id, name=name, routes=[], last_updated=datetime.now(), **_NEW_AIRLINE_DEFAULTS
+    )
+
 
 class FirestoreManager:
     def __init__(self):
-        self.db = None
+        # Set up by watch_market_state
+        self._market_watch = None
+        self._watched_market_state: Optional[MarketState] = None
+        self._watch_lock = threading.Lock()
+        # Teams whose airline document this process has created or seen, filled in by
+        # every airline read; a plain set, as a class has a few dozen teams at most
+        self._known_airlines = set()
         self._initialize_firestore()
     
     def _initialize_firestore(self):
-        try:
-            import os
-            import streamlit as st
-            
-            # Debug info
-            print(f"DEBUG: Initializing Firestore with project_id: {Config.FIRESTORE_PROJECT_ID}")
-            print(f"DEBUG: GOOGLE_APPLICATION_CREDENTIALS path: {Config.GOOGLE_APPLICATION_CREDENTIALS}")
-            
-            # Set GOOGLE_CLOUD_PROJECT environment variable as backup
-            os.environ['GOOGLE_CLOUD_PROJECT'] = Config.FIRESTORE_PROJECT_ID
-            print(f"DEBUG: Set GOOGLE_CLOUD_PROJECT to: {Config.FIRESTORE_PROJECT_ID}")
-            
-            # Try direct approach with service account from Streamlit secrets
-            if hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
-                print("DEBUG: Using direct service account from Streamlit secrets")
-                
-                # Create credentials directly from secrets
-                service_account_info = dict(st.secrets['gcp_service_account'])
-                credentials_obj = service_account.Credentials.from_service_account_info(service_account_info)
-                
-                # Use google-cloud-firestore client directly
-                self.db = firestore_client.Client(
-                    project=Config.FIRESTORE_PROJECT_ID,
-                    credentials=credentials_obj
-                )
-                print("DEBUG: Firestore client created successfully from secrets")
-                return
-            
-            # Fallback to firebase-admin approach
-            if not firebase_admin._apps:
-                if Config.GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(Config.GOOGLE_APPLICATION_CREDENTIALS):
-                    print("DEBUG: Using service account credentials file")
-                    cred = credentials.Certificate(Config.GOOGLE_APPLICATION_CREDENTIALS)
-                    firebase_admin.initialize_app(cred, {
-                        'projectId': Config.FIRESTORE_PROJECT_ID,
-                    })
-                else:
-                    print("DEBUG: Using default credentials with explicit project")
-                    # For Streamlit Cloud, we need to explicitly set the project
-                    firebase_admin.initialize_app(options={
-                        'projectId': Config.FIRESTORE_PROJECT_ID,
-                    })
-            
-            # Create Firestore client via firebase-admin
-            self.db = firestore.client()
-            print("DEBUG: Firestore client created successfully via firebase-admin")
-            
-        except Exception as e:
-            print(f"Error initializing Firestore: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
+        self._clients = itertools.cycle(_firestore_client_pool())
+    
+    @property
+    def db(self):
+        """The next Firestore client from the pool, round-robin.
+        
+        Each access advances the pool, so a method touching Firestore more than
+        once takes one client up front (db = self.db) and uses it throughout.
+        """
+        return next(self._clients)
     
+    def invalidate_reads(self, *method_names: str):
+        """Drop cached reads of the named methods (all of them if none are named),
+        so the next ones go to Firestore; for changes made outside this process.
+        """
+        _invalidate_reads(*(method_names or _CACHED_READ_METHODS))
+    
+    @_cached_read
     def get_airline_state(self, team_id: str) -> Optional[AirlineState]:
         try:
             doc_ref = self.db.collection('airlines').document(team_id)
             doc = doc_ref.get()
             
             if doc.exists:
+                self._known_airlines.add(team_id)
                 data = doc.to_dict()
                 return AirlineState(**data)
             return None
@@ -82,16 +305,124 @@ class FirestoreManager:
             print(f"Error getting airline state: {e}")
             return None
     
+    def create_airline_if_missing(self, airline_state: AirlineState) -> bool:
+        """Create a team's airline document unless it exists, in one write and no read.
+        
+        Returns True if it was created. After the first call for a team, this
+        process answers from memory without touching Firestore.
+        """
+        team_id = airline_state.team_id
+        if team_id in self._known_airlines:
+            return False
+        try:
+            # create() fails the whole batch if the document exists, so the summary is untouched then
+            db = self.db
+            batch = db.batch()
+            batch.create(db.collection('airlines').document(team_id), _write_data(airline_state))
+            batch.set(self._airline_summary_ref(db), _summary_update([airline_state]), merge=True)
+            batch.commit()
+            created = True
+            _invalidate_reads("get_airline_state", "get_airline_and_market_state", args=(team_id,))
+            _invalidate_reads("get_all_airline_states", "get_airline_summary", "count_airlines")
+        except AlreadyExists:
+            created = False
+        except Exception as e:
+            print(f"Error creating airline state: {e}")
+            return False
+        self._known_airlines.add(team_id)
+        return created
+    
     def update_airline_state(self, airline_state: AirlineState) -> bool:
         try:
-            doc_ref = self.db.collection('airlines').document(airline_state.team_id)
-            doc_ref.set(airline_state.model_dump())
+            db = self.db
+            doc_ref = db.collection('airlines').document(airline_state.team_id)
+            # The team's summary entry is written in the same batch so it can't drift
+            batch = db.batch()
+            batch.set(doc_ref, _write_data(airline_state))
+            batch.set(self._airline_summary_ref(db), _summary_update([airline_state]), merge=True)
+            batch.commit()
+            _invalidate_reads("get_airline_state", "get_airline_and_market_state", args=(airline_state.team_id,))
+            _invalidate_reads("get_all_airline_states", "get_airline_summary", "count_airlines")
+            return True
+        except Exception as e:
+            print(f"Error updating airline state: {e}")
+            return False
+    
+    def update_airline_state_partial(self, team_id: str, changes: Dict[str, Any]) -> bool:
+        """Write only the given AirlineState fields of an existing airline document"""
+        try:
+            db = self.db
+            doc_ref = db.collection('airlines').document(team_id)
+            batch = db.batch()
+            if 'last_updated' in changes:
+                changes = {**changes, 'last_updated': firestore.SERVER_TIMESTAMP}
+            batch.update(doc_ref, changes)
+            summary_changes = {field: changes[field] for field in AIRLINE_SUMMARY_FIELDS if field in changes}
+            if 'routes' in changes:
+                summary_changes['route_count'] = len(changes['routes'])
+            if summary_changes:
+                batch.set(self._airline_summary_ref(db), {'teams': {team_id: summary_changes}}, merge=True)
+            batch.commit()
+            _invalidate_reads("get_airline_state", "get_airline_and_market_state", args=(team_id,))
+            _invalidate_reads("get_all_airline_states", "get_airline_summary")
             return True
         except Exception as e:
             print(f"Error updating airline state: {e}")
             return False
     
+    def get_airline_states(self, team_ids: List[str]) -> Dict[str, AirlineState]:
+        """Fetch several teams' airline states in one batched read.
+        
+        Each state found also warms the cache behind get_airline_state.
+        """
+        try:
+            db = self.db
+            collection = db.collection('airlines')
+            refs = [collection.document(team_id) for team_id in dict.fromkeys(team_ids)]
+            airlines = {}
+            if not refs:
+                return airlines
+            generations = {ref.id: _current_read_generation(("get_airline_state", ref.id)) for ref in refs}
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    # Stored from validated dumps, as in get_all_airline_states
+                    airline_state = AirlineState.model_construct(**doc.to_dict())
+                    airlines[doc.id] = airline_state
+                    _store_read(("get_airline_state", doc.id), airline_state, generations[doc.id])
+            self._known_airlines.update(airlines)
+            return airlines
+        except Exception as e:
+            print(f"Error getting airline states: {e}")
+            return {}
+    
+    def watch_market_state(self):
+        """Keep the market state current from a snapshot listener, so get_market_state
+        is answered from memory. Safe to call repeatedly; restarts a dropped listener.
+        """
+        with self._watch_lock:
+            if self._market_watch is not None and self._market_watch.is_active:
+                return
+            try:
+                doc_ref = self.db.collection('simulation').document('market_state')
+                self._market_watch = doc_ref.on_snapshot(self._on_market_snapshot)
+            except Exception as e:
+                print(f"Error watching market state: {e}")
+    
+    def _on_market_snapshot(self, docs, changes, read_time):
+        # Runs on the listener's thread; an empty list means the document is gone
+        self._watched_market_state = next(
+            (MarketState(**doc.to_dict()) for doc in docs if doc.exists), None
+        )
+    
     def get_market_state(self) -> Optional[MarketState]:
+        watched = self._watched_market_state
+        if watched is not None and self._market_watch is not None and self._market_watch.is_active:
+            return copy.deepcopy(watched)
+        return self._fetch_market_state()
+    
+    # Read on nearly every page; a slightly stale market beats waiting on Firestore
+    @_stale_while_revalidate_read
+    def _fetch_market_state(self) -> Optional[MarketState]:
         try:
             doc_ref = self.db.collection('simulation').document('market_state')
             doc = doc_ref.get()
@@ -104,19 +435,142 @@ class FirestoreManager:
             print(f"Error getting market state: {e}")
             return None
     
+    @_cached_read
+    def get_airline_and_market_state(self, team_id: str) -> Tuple[Optional[AirlineState], Optional[MarketState]]:
+        """Fetch a team's airline state and the market state in a single batched read"""
+        try:
+            db = self.db
+            airline_ref = db.collection('airlines').document(team_id)
+            market_ref = db.collection('simulation').document('market_state')
+            
+            airline_state = None
+            market_state = None
+            for doc in db.get_all([airline_ref, market_ref]):
+                if not doc.exists:
+                    continue
+                if doc.reference.path == airline_ref.path:
+                    airline_state = AirlineState(**doc.to_dict())
+                else:
+                    market_state = MarketState(**doc.to_dict())
+            return airline_state, market_state
+        except Exception as e:
+            print(f"Error getting airline and market state: {e}")
+            return None, None
+    
+    def get_all_airline_and_market_states(self) -> Tuple[List[AirlineState], Optional[MarketState]]:
+        """Every airline's state and the market state, fetched concurrently"""
+        airlines_future = _read_executor.submit(self.get_all_airline_states)
+        market_state = self.get_market_state()
+        return airlines_future.result(), market_state
+    
+    def prefetch(self, *reads: Callable[[], Any]) -> None:
+        """Run independent cached reads concurrently, so later calls are served from the read cache"""
+        futures = [_read_executor.submit(read) for read in reads[1:]]
+        if reads:
+            reads[0]()
+        for future in futures:
+            future.result()
+    
     def update_market_state(self, market_state: MarketState) -> bool:
         try:
             doc_ref = self.db.collection('simulation').document('market_state')
-            doc_ref.set(market_state.model_dump())
+            doc_ref.set(_write_data(market_state))
+            # Until the listener delivers the new snapshot, read through to Firestore
+            self._watched_market_state = None
+            _invalidate_reads("_fetch_market_state", "get_airline_and_market_state")
+            return True
+        except Exception as e:
+            print(f"Error updating market state: {e}")
+            return False
+    
+    def update_market_state_partial(self, changes: Dict[str, Any], new_events: List[str] = ()) -> bool:
+        """Update given market fields and append events in one write, without reading the document.
+        
+        Events go through ArrayUnion so concurrent appends aren't lost; an event
+        whose exact text is already present is not added again. A partial update
+        can't create the document, so NotFound is raised if the market state
+        hasn't been initialized yet.
+        """
+        try:
+            doc_ref = self.db.collection('simulation').document('market_state')
+            update = {**changes, 'last_updated': firestore.SERVER_TIMESTAMP}
+            if new_events:
+                update['events'] = firestore.ArrayUnion(list(new_events))
+            doc_ref.update(update)
+            self._watched_market_state = None
+            _invalidate_reads("_fetch_market_state", "get_airline_and_market_state")
             return True
+        except NotFound:
+            raise
         except Exception as e:
             print(f"Error updating market state: {e}")
             return False
     
+    def batch_update_airline_states(
+        self, airline_states: List[AirlineState], market_state: Optional[MarketState] = None
+    ) -> bool:
+        """Write several airline states, and optionally the market state, in one atomic batch"""
+        try:
+            db = self.db
+            batch = db.batch()
+            for airline_state in airline_states:
+                doc_ref = db.collection('airlines').document(airline_state.team_id)
+                batch.set(doc_ref, _write_data(airline_state))
+            if market_state is not None:
+                batch.set(db.collection('simulation').document('market_state'), _write_data(market_state))
+            batch.set(self._airline_summary_ref(db), _summary_update(airline_states), merge=True)
+            batch.commit()
+            _invalidate_reads(
+                "get_airline_state", "get_airline_and_market_state", "get_all_airline_states",
+                "get_airline_summary", "_fetch_market_state", "count_airlines"
+            )
+            if market_state is not None:
+                self._watched_market_state = None
+            return True
+        except Exception as e:
+            print(f"Error batch updating airline states: {e}")
+            return False
+    
+    def create_teams(self, users: Dict[str, Dict[str, Any]], airline_states: List[AirlineState]) -> bool:
+        """Write new teams' user documents and starting airline states in batched commits.
+        
+        Commits at most FIRESTORE_BATCH_LIMIT writes at a time, so a failure part
+        way through a very large seed can leave the earlier chunks written.
+        """
+        try:
+            db = self.db
+            # (document, data, merge) for every write
+            writes = [
+                (db.collection('users').document(team_id), user_doc, False)
+                for team_id, user_doc in users.items()
+            ]
+            writes.extend(
+                (db.collection('airlines').document(airline_state.team_id), _write_data(airline_state), False)
+                for airline_state in airline_states
+            )
+            # One merge registers every new team in the summary document
+            writes.append((self._airline_summary_ref(db), _summary_update(airline_states), True))
+            
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                batch = db.batch()
+                for doc_ref, data, merge in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                    batch.set(doc_ref, data, merge=merge)
+                batch.commit()
+            
+            _invalidate_reads(
+                "get_airline_state", "get_airline_and_market_state", "get_all_airline_states",
+                "get_airline_summary", "count_airlines"
+            )
+            return True
+        except Exception as e:
+            print(f"Error creating teams: {e}")
+            return False
+    
     def save_semester_plan(self, plan: SemesterPlan) -> bool:
         try:
             doc_ref = self.db.collection('plans').document(f"{plan.team_id}_{plan.semester}")
             doc_ref.set(plan.model_dump())
+            _invalidate_reads("get_latest_plan_per_team", "count_plans")
             return True
         except Exception as e:
             print(f"Error saving semester plan: {e}")
@@ -135,6 +589,38 @@ class FirestoreManager:
             print(f"Error getting semester plan: {e}")
             return None
     
+    @_cached_read
+    def get_latest_plan_per_team(self) -> Dict[str, Dict[str, Any]]:
+        """Each team's most recent plan as {'date', 'action_count'}, from one ordered query"""
+        try:
+            query = (
+                self.db.collection('plans')
+                .select(['team_id', 'submission_timestamp', 'actions'])
+                .order_by('submission_timestamp', direction=firestore.Query.DESCENDING)
+            )
+            latest = {}
+            for doc in query.stream():
+                data = doc.to_dict()
+                # Newest first, so the first plan seen for a team is its latest
+                if data.get('team_id') not in latest:
+                    latest[data.get('team_id')] = {
+                        'date': data.get('submission_timestamp', 'Unknown'),
+                        'action_count': len(data.get('actions', []))
+                    }
+            return latest
+        except Exception as e:
+            print(f"Error getting latest plans: {e}")
+            return {}
+    
+    @_cached_read
+    def count_plans(self) -> int:
+        """Number of submitted plans, via a server-side count (billed as one read)"""
+        try:
+            return self.db.collection('plans').count().get()[0][0].value
+        except Exception as e:
+            print(f"Error counting plans: {e}")
+            return 0
+    
     def save_evaluation_feedback(self, feedback: EvaluationFeedback) -> bool:
         try:
             doc_ref = self.db.collection('feedback').add(feedback.model_dump())
@@ -143,18 +629,77 @@ class FirestoreManager:
             print(f"Error saving evaluation feedback: {e}")
             return False
     
+    def save_evaluation_feedbacks(self, feedbacks: List[EvaluationFeedback]) -> bool:
+        """Save several teams' feedback in batched commits instead of one write each"""
+        try:
+            db = self.db
+            collection = db.collection('feedback')
+            for start in range(0, len(feedbacks), FIRESTORE_BATCH_LIMIT):
+                batch = db.batch()
+                for feedback in feedbacks[start:start + FIRESTORE_BATCH_LIMIT]:
+                    batch.set(collection.document(), feedback.model_dump())
+                batch.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving evaluation feedback: {e}")
+            return False
+    
+    @_cached_read
     def get_all_airline_states(self) -> List[AirlineState]:
+        """Every airline's state.
+        
+        Documents are written from validated AirlineState dumps, so they are
+        loaded with model_construct.
+        """
         try:
-            docs = self.db.collection('airlines').stream()
-            airlines = []
-            for doc in docs:
-                data = doc.to_dict()
-                airlines.append(AirlineState(**data))
-            return airlines
+            query = self.db.collection('airlines')
+            docs = list(query.stream())
+            self._known_airlines.update(doc.id for doc in docs)
+            return [AirlineState.model_construct(**doc.to_dict()) for doc in docs]
         except Exception as e:
             print(f"Error getting all airline states: {e}")
             return []
     
+    @_cached_read
+    def count_airlines(self) -> int:
+        """Number of airlines, via a server-side count (billed as one read)"""
+        try:
+            return self.db.collection('airlines').count().get()[0][0].value
+        except Exception as e:
+            print(f"Error counting airlines: {e}")
+            return 0
+    
+    def _airline_summary_ref(self, db):
+        # Kept outside the 'airlines' collection so it never shows up as an airline
+        return db.collection('simulation').document('airline_summary')
+    
+    @_cached_read
+    def get_airline_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-team summary figures (AIRLINE_SUMMARY_FIELDS and route_count) from one aggregate document.
+        
+        The document is maintained by every airline write; if it doesn't exist
+        yet, predates a summary field, or holds a different number of teams than
+        the airlines collection (a write that missed it, or an airline deleted
+        since), it is rebuilt from the collection. The rebuild overwrites the
+        whole document, so entries for deleted airlines are dropped.
+        """
+        try:
+            db = self.db
+            doc = self._airline_summary_ref(db).get()
+            if doc.exists:
+                teams = doc.to_dict().get('teams', {})
+                if (len(teams) == self.count_airlines()
+                        and all(_SUMMARY_ENTRY_KEYS <= entry.keys() for entry in teams.values())):
+                    return teams
+            
+            airline_states = self.get_all_airline_states()
+            summary = _summary_update(airline_states)
+            self._airline_summary_ref(db).set(summary)
+            return summary['teams']
+        except Exception as e:
+            print(f"Error getting airline summary: {e}")
+            return {}
+    
     def initialize_default_data(self):
         default_market = MarketState(
             total_passengers=1000000,
@@ -163,4 +708,14 @@ class FirestoreManager:
             events=[],
             last_updated=datetime.now()
         )
-        self.update_market_state(default_market)
\ No newline at end of file
+        self.update_market_state(default_market)
+
+
+@functools.lru_cache(maxsize=1)
+def get_firestore_manager() -> FirestoreManager:
+    """The process's single FirestoreManager, so every caller shares one client.
+    
+    A plain lru_cache rather than st.cache_resource: the agents also call this
+    from worker threads that run outside a Streamlit script context.
+    """
+    return FirestoreManager()
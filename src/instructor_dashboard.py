@@ -3,29 +3,104 @@ Instructor Dashboard for Managing Airline Simulation
 """
 
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-from typing import List, Dict, Any
-import json
+from functools import cached_property
+from google.api_core.exceptions import NotFound
+from typing import List, Dict, Any, Optional
 
-from .database import FirestoreManager
-from .models import *
+from . import json_utils
+from .config import Config
+from .database import get_firestore_manager
+from .models import AirlineState, MarketState, SemesterPlan
 from .workflow import SimulationWorkflow
-from .user_management import UserManager, AdminInterface
+from .user_management import AdminInterface, get_user_manager
+
+
+# Teams per page of the plan status table
+PLAN_STATUS_PAGE_SIZE = 25
+
+
+# Every tab renders on each rerun, so the reads they share are cached across tabs and reruns
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_all_airline_states() -> List[AirlineState]:
+    return get_firestore_manager().get_all_airline_states()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_airline_summary() -> Dict[str, Dict[str, Any]]:
+    return get_firestore_manager().get_airline_summary()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_team_ids() -> List[str]:
+    # Cached separately so team pickers don't unpickle every full airline state per rerun
+    return [airline.team_id for airline in cached_all_airline_states()]
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_airline_state(team_id: str) -> Optional[AirlineState]:
+    return get_firestore_manager().get_airline_state(team_id)
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_market_state() -> Optional[MarketState]:
+    return get_firestore_manager().get_market_state()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def cached_simulation_status(_workflow: SimulationWorkflow) -> Dict[str, Any]:
+    return _workflow.get_simulation_status()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def prefetch_dashboard_reads() -> bool:
+    # The tabs' reads are independent round trips; issue them together, but only
+    # when the wrappers above have gone cold with it (same TTL, cleared together)
+    db = get_firestore_manager()
+    db.prefetch(
+        db.get_all_airline_states,
+        db.get_airline_summary,
+        db.get_market_state,
+        db.get_latest_plan_per_team,
+        db.count_plans
+    )
+    return True
+
+
+def clear_dashboard_cache():
+    """Drop the dashboard's cached reads after it changed airline/market state"""
+    cached_all_airline_states.clear()
+    cached_airline_summary.clear()
+    cached_team_ids.clear()
+    cached_airline_state.clear()
+    cached_market_state.clear()
+    cached_simulation_status.clear()
+    prefetch_dashboard_reads.clear()
 
 
 class InstructorDashboard:
     def __init__(self):
-        self.db = FirestoreManager()
-        self.workflow = SimulationWorkflow()
-        self.user_manager = UserManager()
+        self.db = get_firestore_manager()
+        self.user_manager = get_user_manager()
         self.admin_interface = AdminInterface()
     
+    @cached_property
+    def workflow(self) -> SimulationWorkflow:
+        # Builds all three agents and compiles the graph; wait until a tab needs it
+        return SimulationWorkflow()
+    
     def show_dashboard(self):
         """Main instructor dashboard interface"""
         st.title("👨‍🏫 Instructor Dashboard")
         
-        # Tabs for different instructor functions
+        if st.button("🔄 Refresh data", help="Reload teams and market state from the database"):
+            # Both cache layers: the dashboard's own and the Firestore manager's
+            self.db.invalidate_reads()
+            clear_dashboard_cache()
+        
+        prefetch_dashboard_reads()
+        
+        # Tabs for different instructor functions; the interactive ones are
+        # fragments, so their widgets rerun only their own tab
         tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
             "📊 Overview", 
             "📋 Plan Status", 
@@ -58,7 +133,7 @@ class InstructorDashboard:
         st.header("📊 Simulation Overview")
         
         # Get current simulation state
-        status = self.workflow.get_simulation_status()
+        status = cached_simulation_status(self.workflow)
         
         if 'error' in status:
             st.error(f"Error loading simulation status: {status['error']}")
@@ -113,48 +188,61 @@ class InstructorDashboard:
                     st.write(f"Team: {cash_leader['team_id']}")
                     st.write(f"Cash: ${cash_leader['cash']:,.0f}")
     
+    @st.fragment
     def _show_plan_status(self):
         """Show status of team plan submissions"""
         st.header("📋 Team Plan Submission Status")
         
-        # Get all teams and their plan status
-        airlines = self.db.get_all_airline_states()
+        # Get all teams and their plan status; the summary document is one read
+        # and leaves out each team's route list
+        summary = cached_airline_summary()
         
-        if not airlines:
+        if not summary:
             st.warning("No teams found. Create teams first using the admin interface.")
             return
         
-        # Create status table
-        status_data = []
-        
-        for airline in airlines:
-            # Check for submitted plans (simplified - check latest plan)
-            latest_plan = self._get_latest_plan(airline.team_id)
-            
-            status_data.append({
-                'Team ID': airline.team_id,
-                'Team Name': airline.name,
-                'Cash': f"${airline.cash:,.0f}",
-                'Aircraft': airline.aircraft_count,
-                'Routes': len(airline.routes),
-                'Last Plan': latest_plan['date'] if latest_plan else 'None',
-                'Plan Status': '✅ Submitted' if latest_plan else '❌ Missing',
-                'Actions': latest_plan['action_count'] if latest_plan else 0
-            })
-        
-        df = pd.DataFrame(status_data)
+        team_ids = sorted(summary)
+        latest_plans = self.db.get_latest_plan_per_team()
+        
+        # Only the visible page of teams is turned into table rows and sent to the browser
+        page_count = -(-len(team_ids) // PLAN_STATUS_PAGE_SIZE)
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+        start = (page - 1) * PLAN_STATUS_PAGE_SIZE
+        page_team_ids = team_ids[start:start + PLAN_STATUS_PAGE_SIZE]
+        
+        import pandas as pd  # deferred: only this tab builds a DataFrame
+        
+        # Create status table, column by column
+        teams = [summary[team_id] for team_id in page_team_ids]
+        plans = [latest_plans.get(team_id) for team_id in page_team_ids]
+        
+        df = pd.DataFrame({
+            'Team ID': page_team_ids,
+            'Team Name': [team['name'] for team in teams],
+            'Cash': [team['cash'] for team in teams],
+            'Aircraft': [team['aircraft_count'] for team in teams],
+            'Routes': [team['route_count'] for team in teams],
+            'Last Plan': [plan['date'] if plan else 'None' for plan in plans],
+            'Plan Status': ['✅ Submitted' if plan else '❌ Missing' for plan in plans],
+            'Actions': [plan['action_count'] if plan else 0 for plan in plans]
+        })
+        df['Cash'] = df['Cash'].map('${:,.0f}'.format)
         st.dataframe(df, use_container_width=True)
         
-        # Summary
-        submitted_count = sum(1 for row in status_data if row['Plan Status'] == '✅ Submitted')
-        total_count = len(status_data)
+        if page_count > 1:
+            st.caption(f"Teams {start + 1}-{start + len(page_team_ids)} of {len(team_ids)}")
+        
+        # Summary (over every team, not just this page)
+        missing_teams = [team_id for team_id in team_ids if team_id not in latest_plans]
+        total_count = len(team_ids)
+        submitted_count = total_count - len(missing_teams)
         
         st.write(f"**Summary:** {submitted_count}/{total_count} teams have submitted plans")
         
-        if submitted_count < total_count:
-            missing_teams = [row['Team ID'] for row in status_data if row['Plan Status'] == '❌ Missing']
+        if missing_teams:
             st.warning(f"Missing plans from: {', '.join(missing_teams)}")
     
+    @st.fragment
     def _show_simulation_control(self):
         """Control simulation workflow execution"""
         st.header("🚀 Simulation Control")
@@ -173,7 +261,7 @@ class InstructorDashboard:
             
             # Show submission status
             submitted_plans = self._count_submitted_plans()
-            total_teams = len(self.db.get_all_airline_states())
+            total_teams = self.db.count_airlines()
             
             st.write(f"Plans submitted: {submitted_plans}/{total_teams}")
             
@@ -208,43 +296,45 @@ class InstructorDashboard:
                 if st.button("⚠️ Confirm Reset"):
                     self._reset_simulation()
     
+    @st.fragment
     def _show_feedback_review(self):
         """Review and manage team feedback"""
         st.header("📝 Team Feedback Review")
         
         # Get all teams
-        airlines = self.db.get_all_airline_states()
+        team_options = cached_team_ids()
         
-        if not airlines:
+        if not team_options:
             st.warning("No teams found")
             return
         
         # Team selection
-        team_options = [airline.team_id for airline in airlines]
         selected_team = st.selectbox("Select Team", team_options)
         
         if selected_team:
             self._show_team_feedback(selected_team)
     
+    @st.fragment
     def _show_airline_details(self):
         """Detailed view of individual airlines"""
         st.header("🏢 Airline Details")
         
-        airlines = self.db.get_all_airline_states()
+        team_options = cached_team_ids()
         
-        if not airlines:
+        if not team_options:
             st.warning("No airlines found")
             return
         
         # Team selection
-        team_options = [airline.team_id for airline in airlines]
         selected_team = st.selectbox("Select Airline", team_options)
         
         if selected_team:
-            airline = next((a for a in airlines if a.team_id == selected_team), None)
+            # Only the chosen airline is loaded, by document ID
+            airline = cached_airline_state(selected_team)
             if airline:
                 self._show_detailed_airline_view(airline)
     
+    @st.fragment
     def _show_market_management(self):
         """Market data management and event injection"""
         st.header("📈 Market Management")
@@ -253,7 +343,7 @@ class InstructorDashboard:
         
         with col1:
             st.subheader("📊 Current Market State")
-            market_state = self.db.get_market_state()
+            market_state = cached_market_state()
             
             if market_state:
                 st.write(f"**Total Passengers:** {market_state.total_passengers:,}")
@@ -277,7 +367,7 @@ class InstructorDashboard:
             
             if uploaded_market and st.button("Upload Market Data"):
                 try:
-                    market_data = json.load(uploaded_market)
+                    market_data = json_utils.loads(uploaded_market.getvalue())
                     self._update_market_data(market_data)
                     st.success("Market data updated!")
                 except Exception as e:
@@ -292,36 +382,13 @@ class InstructorDashboard:
             if st.button("Add Market Event") and event_text:
                 self._add_market_event(event_text)
                 st.success("Market event added!")
-                st.rerun()
+                # Redraw just this tab so the event list shows the new event
+                st.rerun(scope="fragment")
     
     # Helper methods
     def _count_submitted_plans(self) -> int:
         """Count how many teams have submitted plans"""
-        # This is a simplified implementation
-        # In reality, you'd query the plans collection
-        try:
-            plans_ref = self.db.db.collection('plans')
-            docs = list(plans_ref.stream())
-            return len(docs)
-        except:
-            return 0
-    
-    def _get_latest_plan(self, team_id: str) -> Dict[str, Any]:
-        """Get the latest plan for a team"""
-        try:
-            plans_ref = self.db.db.collection('plans')
-            query = plans_ref.where('team_id', '==', team_id).order_by('submission_timestamp', direction='DESCENDING').limit(1)
-            docs = list(query.stream())
-            
-            if docs:
-                plan_data = docs[0].to_dict()
-                return {
-                    'date': plan_data.get('submission_timestamp', 'Unknown'),
-                    'action_count': len(plan_data.get('actions', []))
-                }
-            return None
-        except:
-            return None
+        return self.db.count_plans()
     
     def _run_simulation(self):
         """Run the complete simulation workflow"""
@@ -338,6 +405,7 @@ class InstructorDashboard:
                 results = self.workflow.process_semester_plans(plans)
                 
                 # Show results summary
+                clear_dashboard_cache()
                 st.success(f"Simulation completed! Processed {len(plans)} plans.")
                 
                 # Display summary
@@ -384,37 +452,29 @@ class InstructorDashboard:
     
     def _update_market_data(self, market_data: Dict[str, Any]):
         """Update market state from uploaded data"""
-        try:
-            # Update market state
-            current_market = self.db.get_market_state()
-            
-            if current_market:
-                # Update fields from uploaded data
-                if 'total_passengers' in market_data:
-                    current_market.total_passengers = market_data['total_passengers']
-                if 'competition_level' in market_data:
-                    current_market.competition_level = market_data['competition_level']
-                if 'economic_conditions' in market_data:
-                    current_market.economic_conditions = market_data['economic_conditions']
-                if 'events' in market_data:
-                    current_market.events.extend(market_data['events'])
-                
-                current_market.last_updated = datetime.now()
-                self.db.update_market_state(current_market)
-        
-        except Exception as e:
-            st.error(f"Failed to update market data: {e}")
+        # Update fields from uploaded data
+        changes = {
+            field: market_data[field]
+            for field in ('total_passengers', 'competition_level', 'economic_conditions')
+            if field in market_data
+        }
+        self._update_market_state(changes, market_data.get('events', []), "Failed to update market data")
     
     def _add_market_event(self, event_text: str):
         """Add a market event"""
+        self._update_market_state({}, [event_text], "Failed to add market event")
+    
+    def _update_market_state(self, changes: Dict[str, Any], new_events: List[str], failure_message: str):
         try:
-            market_state = self.db.get_market_state()
-            if market_state:
-                market_state.events.append(event_text)
-                market_state.last_updated = datetime.now()
-                self.db.update_market_state(market_state)
-        except Exception as e:
-            st.error(f"Failed to add market event: {e}")
+            updated = self.db.update_market_state_partial(changes, new_events=new_events)
+        except NotFound:
+            st.error(f"{failure_message}: the market state hasn't been initialized yet. "
+                     "Reset the simulation from the Run Simulation tab to create it.")
+            return
+        if updated:
+            clear_dashboard_cache()
+        else:
+            st.error(failure_message)
     
     def _process_company_plans(self):
         """Process only company agent step"""
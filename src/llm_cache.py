@@ -0,0 +1,57 @@
+"""
+On-disk cache for LLM completions, keyed by a hash of the request
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+from . import json_utils
+from .config import Config
+
+# Request parameters that do not change the response and must not end up in the key
+_UNKEYED_PARAMS = {"api_key", "timeout"}
+
+
+def _cache_path(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Path:
+    keyed = {k: v for k, v in params.items() if k not in _UNKEYED_PARAMS}
+    payload = json_utils.dumps({"model": model, "messages": messages, **keyed}, sort_keys=True)
+    digest = hashlib.sha256(payload).hexdigest()
+    return Path(Config.LLM_CACHE_DIR) / digest[:2] / f"{digest}.json"
+
+
+def cached_completion(model: str, messages: List[Dict[str, Any]], **kwargs) -> str:
+    """Return the completion text for a request, answering repeats from disk.
+
+    Only requests that explicitly ask for temperature=0 are cached; without
+    it the provider samples (Gemini's default is above 0), so those requests
+    always go to the model. So does everything when LLM_CACHE_DIR is empty.
+    """
+    use_cache = bool(Config.LLM_CACHE_DIR) and kwargs.get("temperature") == 0
+    path = _cache_path(model, messages, kwargs) if use_cache else None
+
+    if path is not None and path.is_file():
+        try:
+            return json_utils.loads(path.read_bytes())["content"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable LLM cache entry {path}: {e}")
+
+    import litellm  # deferred: slow to import, only needed on a cache miss
+
+    response = litellm.completion(model=model, messages=messages, **kwargs)
+    content = response.choices[0].message.content
+
+    if path is not None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write a private temp file then rename, so concurrent readers never see
+            # a partial file and concurrent writers (threads included) never share one
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as tmp_file:
+                tmp_file.write(json_utils.dumps({"model": model, "content": content}))
+            os.replace(tmp_file.name, path)
+        except OSError as e:
+            print(f"Error writing LLM cache entry {path}: {e}")
+
+    return content
@@ -1,28 +1,90 @@
 import os
-from typing import Optional, Dict, Any
-from datetime import datetime
-import json
+import atexit
+import importlib.util
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Union
+from datetime import datetime, timedelta, timezone
+
+# Importing langsmith costs a few hundred ms, so it waits until observability is
+# actually enabled; everything else only needs to know whether it is installed
+LANGSMITH_AVAILABLE = importlib.util.find_spec("langsmith") is not None
+
+
+def traceable(name: Optional[str] = None):
+    """langsmith's traceable decorator, imported on first use (only with observability enabled)"""
+    from langsmith.run_helpers import traceable as langsmith_traceable
+    return langsmith_traceable(name=name)
 
-try:
-    from langsmith import Client
-    from langsmith.run_helpers import traceable
-    LANGSMITH_AVAILABLE = True
-except ImportError:
-    LANGSMITH_AVAILABLE = False
-    # Define dummy decorator if langsmith not available
-    def traceable(name: Optional[str] = None):
-        def decorator(func):
-            return func
-        return decorator
 
 from .config import Config
 
 
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+# (epoch second, its ISO string), shared by every event logged within that second
+_now_iso_cache = (0, "")
+
+
+def _now_iso() -> str:
+    """Local time as an ISO string at one-second resolution, formatted once per second"""
+    global _now_iso_cache
+    second = int(time.time())
+    cached_second, text = _now_iso_cache
+    if second != cached_second:
+        text = datetime.fromtimestamp(second).isoformat()
+        _now_iso_cache = (second, text)
+    return text
+
+# Runs waiting to be sent to LangSmith; beyond this many, new runs are dropped
+RUN_QUEUE_MAX_SIZE = 1000
+# Most runs sent in one batch_ingest_runs request
+RUN_BATCH_SIZE = 500
+# How long the sender waits for a batch to fill before sending what it has
+RUN_BATCH_WAIT_SECONDS = 1.0
+# Batches in flight to LangSmith at once, so one slow request doesn't back up the queue
+RUN_SEND_WORKERS = 4
+
+
+def configure_logging(level: Optional[str] = None):
+    """Route log records through a queue so request threads never block on stderr.
+    
+    Safe to call on every Streamlit rerun; only the first call installs handlers.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+    
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root_logger = logging.getLogger()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level or Config.LOG_LEVEL)
+    
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _log_listener.start()
+
+
 class ObservabilityManager:
     def __init__(self):
         self.client = None
         self.enabled = False
+        self._runs: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=RUN_QUEUE_MAX_SIZE)
+        self._send_pool: Optional[ThreadPoolExecutor] = None
         self._initialize_langsmith()
+        
+        if self.enabled:
+            # log_* calls only enqueue; this thread batches the runs and hands them to the pool
+            self._send_pool = ThreadPoolExecutor(max_workers=RUN_SEND_WORKERS, thread_name_prefix="obs")
+            threading.Thread(target=self._drain_runs, name="langsmith-runs", daemon=True).start()
+            atexit.register(self._flush)
     
     def _initialize_langsmith(self):
         if not LANGSMITH_AVAILABLE:
@@ -34,6 +96,8 @@ class ObservabilityManager:
                 os.environ["LANGSMITH_API_KEY"] = Config.LANGSMITH_API_KEY
                 os.environ["LANGSMITH_PROJECT"] = Config.LANGSMITH_PROJECT
                 
+                from langsmith import Client
+                
                 self.client = Client()
                 self.enabled = True
                 print(f"LangSmith observability enabled for project: {Config.LANGSMITH_PROJECT}")
@@ -44,61 +108,120 @@ class ObservabilityManager:
         else:
             print("LangSmith credentials not configured - observability disabled")
     
+    def _enqueue_run(
+        self,
+        name: str,
+        run_type: str,
+        inputs: Dict[str, Any],
+        outputs: Union[Dict[str, Any], Any],
+        duration_ms: Optional[int] = None
+    ):
+        """Queue a finished, single-run trace for the background sender.
+        
+        outputs may also be a Pydantic model; it is dumped on the sender's thread.
+        """
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(milliseconds=duration_ms) if duration_ms else end_time
+        run_id = str(uuid.uuid4())
+        run = {
+            "id": run_id,
+            "trace_id": run_id,
+            # batch_ingest_runs requires these; a root run's order is its start time and id
+            "dotted_order": f"{start_time:%Y%m%dT%H%M%S%fZ}{run_id}",
+            "name": name,
+            "run_type": run_type,
+            "inputs": inputs,
+            "outputs": outputs,
+            "start_time": start_time,
+            "end_time": end_time,
+            "session_name": Config.LANGSMITH_PROJECT
+        }
+        try:
+            self._runs.put_nowait(run)
+        except queue.Full:
+            # Tracing is best-effort; never hold up the simulation for it
+            pass
+    
+    def _drain_runs(self):
+        while True:
+            batch = [self._runs.get()]
+            deadline = time.monotonic() + RUN_BATCH_WAIT_SECONDS
+            while len(batch) < RUN_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._runs.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._send_pool.submit(self._send_runs, batch)
+            except RuntimeError:
+                # The pool refuses new work once the interpreter is shutting down
+                self._send_runs(batch)
+    
+    def _send_runs(self, runs: List[Dict[str, Any]]):
+        try:
+            for run in runs:
+                if hasattr(run["outputs"], "model_dump"):
+                    run["outputs"] = run["outputs"].model_dump()
+            self.client.batch_ingest_runs(create=runs)
+        except Exception as e:
+            print(f"Failed to log {len(runs)} runs to LangSmith: {e}")
+    
+    def _flush(self):
+        """Send whatever is still queued; registered to run at interpreter exit"""
+        runs = []
+        while True:
+            try:
+                runs.append(self._runs.get_nowait())
+            except queue.Empty:
+                break
+        if runs:
+            self._send_runs(runs)
+    
     def log_plan_submission(self, team_id: str, plan_data: Dict[str, Any]):
         """Log when a team submits a plan"""
         if not self.enabled:
             return
         
-        try:
-            self.client.create_run(
-                name="plan_submission",
-                run_type="chain",
-                inputs={
-                    "team_id": team_id,
-                    "semester": plan_data.get("semester"),
-                    "action_count": len(plan_data.get("actions", [])),
-                    "total_budget": plan_data.get("total_budget")
-                },
-                outputs={
-                    "status": "submitted",
-                    "timestamp": datetime.now().isoformat()
-                },
-                project_name=Config.LANGSMITH_PROJECT
-            )
-        except Exception as e:
-            print(f"Failed to log plan submission: {e}")
+        self._enqueue_run(
+            name="plan_submission",
+            run_type="chain",
+            inputs={
+                "team_id": team_id,
+                "semester": plan_data.get("semester"),
+                "action_count": len(plan_data.get("actions", [])),
+                "total_budget": plan_data.get("total_budget")
+            },
+            outputs={
+                "status": "submitted",
+                "timestamp": _now_iso()
+            }
+        )
     
     def log_agent_evaluation(
         self, 
         agent_type: str, 
         team_id: str, 
         inputs: Dict[str, Any], 
-        outputs: Dict[str, Any],
+        outputs: Union[Dict[str, Any], Any],
         duration_ms: Optional[int] = None
     ):
         """Log agent evaluation results"""
         if not self.enabled:
             return
         
-        try:
-            run_data = {
-                "name": f"{agent_type}_evaluation",
-                "run_type": "llm",
-                "inputs": {
-                    "team_id": team_id,
-                    **inputs
-                },
-                "outputs": outputs,
-                "project_name": Config.LANGSMITH_PROJECT
-            }
-            
-            if duration_ms:
-                run_data["duration_ms"] = duration_ms
-            
-            self.client.create_run(**run_data)
-            
-        except Exception as e:
-            print(f"Failed to log agent evaluation: {e}")
+        self._enqueue_run(
+            name=f"{agent_type}_evaluation",
+            run_type="llm",
+            inputs={
+                "team_id": team_id,
+                **inputs
+            },
+            outputs=outputs,
+            duration_ms=duration_ms
+        )
     
     def log_workflow_execution(
         self, 
@@ -112,73 +235,59 @@ class ObservabilityManager:
         if not self.enabled:
             return
         
-        try:
-            self.client.create_run(
-                name="workflow_execution",
-                run_type="chain",
-                inputs={
-                    "workflow_id": workflow_id,
-                    "team_count": team_count
-                },
-                outputs={
-                    "success_count": success_count,
-                    "error_count": error_count,
-                    "success_rate": success_count / team_count if team_count > 0 else 0,
-                    "timestamp": datetime.now().isoformat()
-                },
-                project_name=Config.LANGSMITH_PROJECT
-            )
-            
-        except Exception as e:
-            print(f"Failed to log workflow execution: {e}")
+        self._enqueue_run(
+            name="workflow_execution",
+            run_type="chain",
+            inputs={
+                "workflow_id": workflow_id,
+                "team_count": team_count
+            },
+            outputs={
+                "success_count": success_count,
+                "error_count": error_count,
+                "success_rate": success_count / team_count if team_count > 0 else 0,
+                "timestamp": _now_iso()
+            },
+            duration_ms=duration_ms
+        )
     
     def log_market_update(self, market_data: Dict[str, Any]):
         """Log market state updates"""
         if not self.enabled:
             return
         
-        try:
-            self.client.create_run(
-                name="market_update",
-                run_type="chain",
-                inputs={
-                    "previous_state": "market_analysis"
-                },
-                outputs={
-                    "total_passengers": market_data.get("total_passengers"),
-                    "competition_level": market_data.get("competition_level"),
-                    "economic_conditions": market_data.get("economic_conditions"),
-                    "event_count": len(market_data.get("events", [])),
-                    "timestamp": datetime.now().isoformat()
-                },
-                project_name=Config.LANGSMITH_PROJECT
-            )
-            
-        except Exception as e:
-            print(f"Failed to log market update: {e}")
+        self._enqueue_run(
+            name="market_update",
+            run_type="chain",
+            inputs={
+                "previous_state": "market_analysis"
+            },
+            outputs={
+                "total_passengers": market_data.get("total_passengers"),
+                "competition_level": market_data.get("competition_level"),
+                "economic_conditions": market_data.get("economic_conditions"),
+                "event_count": len(market_data.get("events", [])),
+                "timestamp": _now_iso()
+            }
+        )
     
     def log_error(self, error_type: str, error_message: str, context: Dict[str, Any] = None):
         """Log errors for debugging"""
         if not self.enabled:
             return
         
-        try:
-            self.client.create_run(
-                name="error_event",
-                run_type="chain",
-                inputs={
-                    "error_type": error_type,
-                    "context": context or {}
-                },
-                outputs={
-                    "error_message": error_message,
-                    "timestamp": datetime.now().isoformat()
-                },
-                project_name=Config.LANGSMITH_PROJECT
-            )
-            
-        except Exception as e:
-            print(f"Failed to log error: {e}")
+        self._enqueue_run(
+            name="error_event",
+            run_type="chain",
+            inputs={
+                "error_type": error_type,
+                "context": context or {}
+            },
+            outputs={
+                "error_message": error_message,
+                "timestamp": _now_iso()
+            }
+        )
 
 
 # Create global instance
@@ -193,14 +302,15 @@ def trace_company_agent(func):
     
     @traceable(name="company_agent_process")
     def wrapper(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             result = func(*args, **kwargs)
             
             # Log success
-            duration = (datetime.now() - start_time).total_seconds() * 1000
+            duration = (time.perf_counter() - start_time) * 1000
+            # Models are dumped later on the sender's thread, off the agent's path
             if hasattr(result, 'model_dump'):
-                outputs = result.model_dump()
+                outputs = result
             else:
                 outputs = {"result": str(result)}
             
@@ -233,12 +343,12 @@ def trace_market_agent(func):
     
     @traceable(name="market_agent_process")
     def wrapper(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             result = func(*args, **kwargs)
             
             # Log success
-            duration = (datetime.now() - start_time).total_seconds() * 1000
+            duration = (time.perf_counter() - start_time) * 1000
             observability.log_agent_evaluation(
                 agent_type="market",
                 team_id="system",
@@ -261,6 +371,15 @@ def trace_market_agent(func):
     return wrapper
 
 
+def _evaluation_team_id(kwargs: Dict[str, Any]) -> Optional[str]:
+    """The evaluated team, or a batched evaluation's comma-separated team IDs"""
+    if "team_id" in kwargs:
+        return kwargs["team_id"]
+    if kwargs.get("submissions"):
+        return ",".join(plan.team_id for plan, _ in kwargs["submissions"])
+    return None
+
+
 def trace_evaluation_agent(func):
     """Decorator for Evaluation Agent methods"""
     if not observability.enabled:
@@ -268,12 +387,12 @@ def trace_evaluation_agent(func):
     
     @traceable(name="evaluation_agent_process")
     def wrapper(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = time.perf_counter()
         try:
             result = func(*args, **kwargs)
             
             # Log success
-            duration = (datetime.now() - start_time).total_seconds() * 1000
+            duration = (time.perf_counter() - start_time) * 1000
             if hasattr(result, 'model_dump'):
                 outputs = {"score": getattr(result, 'score', None)}
             else:
@@ -281,7 +400,7 @@ def trace_evaluation_agent(func):
             
             observability.log_agent_evaluation(
                 agent_type="evaluation",
-                team_id=kwargs.get("team_id", "unknown"),
+                team_id=_evaluation_team_id(kwargs) or "unknown",
                 inputs={"method": func.__name__},
                 outputs=outputs,
                 duration_ms=int(duration)
@@ -294,7 +413,7 @@ def trace_evaluation_agent(func):
             observability.log_error(
                 error_type="evaluation_agent_error",
                 error_message=str(e),
-                context={"method": func.__name__, "team_id": kwargs.get("team_id")}
+                context={"method": func.__name__, "team_id": _evaluation_team_id(kwargs)}
             )
             raise
     
@@ -3,19 +3,16 @@ Simple custom authentication system that works reliably
 """
 
 import streamlit as st
-import hashlib
+import bcrypt
 from typing import Optional, Tuple
-from datetime import datetime
+from functools import cached_property
 
-from .database import FirestoreManager
-from .models import AirlineState
-from .config import Config
+from .database import get_firestore_manager, new_airline_state
+from .user_management import BCRYPT_MAX_PASSWORD_BYTES
 
 
 class SimpleAuthManager:
     def __init__(self):
-        self.db = FirestoreManager()
-        
         # Simple test credentials - username: password
         self.test_users = {
             'team1': 'secret',
@@ -24,16 +21,32 @@ class SimpleAuthManager:
             'admin': 'secret',
             'instructor': 'secret'
         }
+        
+        # Hashed once per process (the manager is a cache_resource), once per distinct
+        # password; logins then do one bcrypt check, which compares in constant time
+        hashes = {
+            password: bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+            for password in set(self.test_users.values())
+        }
+        self._password_hashes = {user: hashes[password] for user, password in self.test_users.items()}
+        # Unknown usernames are checked against a real hash too, so they take as
+        # long to reject as a wrong password
+        self._unknown_user_hash = next(iter(hashes.values()))
     
-    def hash_password(self, password: str) -> str:
-        """Simple password hashing"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    @cached_property
+    def db(self):
+        # Only needed for first-login airline setup, so don't connect before then
+        return get_firestore_manager()
     
     def verify_password(self, username: str, password: str) -> bool:
         """Verify username and password"""
-        if username in self.test_users:
-            return self.test_users[username] == password
-        return False
+        password_bytes = password.encode()
+        if len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+            # No stored password is this long, and checkpw would raise on it
+            return False
+        stored_hash = self._password_hashes.get(username, self._unknown_user_hash)
+        password_matches = bcrypt.checkpw(password_bytes, stored_hash)
+        return password_matches and username in self._password_hashes
     
     def login(self) -> Tuple[Optional[str], Optional[bool], Optional[str]]:
         """
@@ -96,20 +109,9 @@ class SimpleAuthManager:
     
     def _ensure_airline_exists(self, team_id: str):
         """Create airline state for new teams"""
-        existing_airline = self.db.get_airline_state(team_id)
-        
-        if not existing_airline:
-            default_airline = AirlineState(
-                team_id=team_id,
-                name=f"Airline {team_id.upper()}",
-                cash=Config.MAX_SEMESTER_BUDGET,
-                aircraft_count=0,
-                routes=[],
-                market_share=0.0,
-                reputation=50.0,
-                last_updated=datetime.now()
-            )
-            self.db.update_airline_state(default_airline)
+        # Checked and created in a single write; repeat logins cost no Firestore I/O
+        default_airline = new_airline_state(team_id, f"Airline {team_id.upper()}")
+        self.db.create_airline_if_missing(default_airline)
     
     def get_current_user(self) -> Optional[str]:
         """Get current logged in user"""
@@ -3,27 +3,88 @@ Secure user management system using Firestore
 Credentials are stored in Firestore, not in code
 """
 
-import streamlit_authenticator as stauth
-from typing import Dict, List, Optional
+import bcrypt
+import streamlit as st
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+import functools
+import os
 import secrets
 import string
+from concurrent.futures import ThreadPoolExecutor
 
-from .database import FirestoreManager
+from .config import Config
+from .database import get_firestore_manager, new_airline_state
 from .models import *
 
 
+# bcrypt ignores (and since 5.0 rejects) password bytes past this
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+# Letters and digits only, so distributed passwords are easy to read out and type
+_PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+
+def _hash_password(password: str) -> str:
+    # The same bcrypt hash streamlit_authenticator produces and checks at login
+    password_bytes = password.encode()
+    if len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+        raise ValueError(f"Password is longer than bcrypt's {BCRYPT_MAX_PASSWORD_BYTES}-byte limit")
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode()
+
+
+@st.cache_data(ttl=Config.CACHE_TTL_SECONDS, show_spinner=False)
+def _load_active_users(_db) -> Dict[str, Dict]:
+    """Active users' credentials, streamed from Firestore once per TTL instead of per rerun"""
+    try:
+        users_ref = _db.db.collection('users')
+        # Only the login fields come back, however much else the user documents accumulate
+        docs = users_ref.where('is_active', '==', True).select(['email', 'name', 'password_hash']).stream()
+        
+        credentials = {}
+        for doc in docs:
+            data = doc.to_dict()
+            credentials[doc.id] = {
+                'email': data['email'],
+                'name': data['name'],
+                'password': data['password_hash']
+            }
+        
+        return credentials
+    except Exception as e:
+        print(f"Error loading user credentials: {e}")
+        return {}
+
+
+def _invalidate_credentials():
+    """Drop cached credentials after a user write, so logins see it on the next rerun"""
+    # auth builds its authenticator config on top of _load_active_users and
+    # imports this module, hence the import here rather than at the top
+    from .auth import _load_auth_config
+    _load_active_users.clear()
+    _load_auth_config.clear()
+
+
 class UserManager:
     def __init__(self):
-        self.db = FirestoreManager()
+        self.db = get_firestore_manager()
     
     def create_team_credentials(self, team_id: str, team_name: str, instructor_email: str) -> str:
         """Create new team with random password"""
-        # Generate secure random password
         password = self._generate_password()
-        password_hash = stauth.Hasher([password]).generate()[0]
+        user_doc, initial_airline = self._build_team(team_id, team_name, instructor_email, _hash_password(password))
         
-        # Store in Firestore
+        # User credentials and initial airline state go out in one batched commit
+        if not self.db.create_teams({team_id: user_doc}, [initial_airline]):
+            raise Exception(f"Failed to create team credentials for {team_id}")
+        _invalidate_credentials()
+        
+        return password  # Return plaintext password for distribution
+    
+    def _build_team(
+        self, team_id: str, team_name: str, instructor_email: str, password_hash: str
+    ) -> Tuple[Dict, AirlineState]:
+        """A new team's user document and starting airline state"""
         user_doc = {
             'team_id': team_id,
             'name': team_name,
@@ -35,62 +96,25 @@ class UserManager:
             'last_login': None
         }
         
-        try:
-            # Store user credentials
-            self.db.db.collection('users').document(team_id).set(user_doc)
-            
-            # Create initial airline state
-            from .models import AirlineState
-            from .config import Config
-            
-            initial_airline = AirlineState(
-                team_id=team_id,
-                name=f"Airline {team_name}",
-                cash=Config.MAX_SEMESTER_BUDGET,
-                aircraft_count=0,
-                routes=[],
-                market_share=0.0,
-                reputation=50.0,
-                last_updated=datetime.now()
-            )
-            
-            self.db.update_airline_state(initial_airline)
-            
-            return password  # Return plaintext password for distribution
-            
-        except Exception as e:
-            raise Exception(f"Failed to create team credentials: {e}")
+        initial_airline = new_airline_state(team_id, f"Airline {team_name}")
+        
+        return user_doc, initial_airline
     
     def get_all_users(self) -> Dict[str, Dict]:
         """Get all user credentials for authentication"""
-        try:
-            users_ref = self.db.db.collection('users')
-            docs = users_ref.where('is_active', '==', True).stream()
-            
-            credentials = {}
-            for doc in docs:
-                data = doc.to_dict()
-                credentials[doc.id] = {
-                    'email': data['email'],
-                    'name': data['name'],
-                    'password': data['password_hash']
-                }
-            
-            return credentials
-        except Exception as e:
-            print(f"Error loading user credentials: {e}")
-            return {}
+        return _load_active_users(self.db)
     
     def reset_password(self, team_id: str) -> str:
         """Reset team password and return new password"""
         new_password = self._generate_password()
-        password_hash = stauth.Hasher([new_password]).generate()[0]
+        password_hash = _hash_password(new_password)
         
         try:
             self.db.db.collection('users').document(team_id).update({
                 'password_hash': password_hash,
                 'password_reset_at': datetime.now()
             })
+            _invalidate_credentials()
             return new_password
         except Exception as e:
             raise Exception(f"Failed to reset password: {e}")
@@ -102,6 +126,7 @@ class UserManager:
                 'is_active': False,
                 'deactivated_at': datetime.now()
             })
+            _invalidate_credentials()
         except Exception as e:
             raise Exception(f"Failed to deactivate team: {e}")
     
@@ -116,36 +141,59 @@ class UserManager:
     
     def _generate_password(self, length: int = 12) -> str:
         """Generate secure random password"""
-        alphabet = string.ascii_letters + string.digits
-        password = ''.join(secrets.choice(alphabet) for _ in range(length))
-        return password
+        # One OS RNG draw per password instead of a call per character. Bytes
+        # past the last whole multiple of the alphabet are dropped, so every
+        # character stays equally likely
+        limit = 256 - 256 % len(_PASSWORD_ALPHABET)
+        password = []
+        while len(password) < length:
+            password.extend(
+                _PASSWORD_ALPHABET[b % len(_PASSWORD_ALPHABET)] for b in secrets.token_bytes(length) if b < limit
+            )
+        return ''.join(password[:length])
     
     def bulk_create_teams(self, team_count: int, instructor_email: str) -> List[Dict[str, str]]:
         """Create multiple teams at once"""
         teams = []
+        users = {}
+        airlines = []
+        
+        # bcrypt is deliberately slow but releases the GIL, so hash on every core at once
+        passwords = [self._generate_password() for _ in range(team_count)]
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            password_hashes = list(executor.map(_hash_password, passwords))
         
-        for i in range(1, team_count + 1):
+        for i, password, password_hash in zip(range(1, team_count + 1), passwords, password_hashes):
             team_id = f"team{i:02d}"  # team01, team02, etc.
             team_name = f"Team {i}"
             
-            try:
-                password = self.create_team_credentials(team_id, team_name, instructor_email)
-                teams.append({
-                    'team_id': team_id,
-                    'team_name': team_name,
-                    'password': password
-                })
-            except Exception as e:
-                print(f"Failed to create {team_id}: {e}")
+            users[team_id], airline = self._build_team(team_id, team_name, instructor_email, password_hash)
+            airlines.append(airline)
+            teams.append({
+                'team_id': team_id,
+                'team_name': team_name,
+                'password': password
+            })
+        
+        # Every team's documents go out in batched commits rather than one write each
+        if not self.db.create_teams(users, airlines):
+            return []
+        _invalidate_credentials()
         
         return teams
 
 
+@functools.lru_cache(maxsize=1)
+def get_user_manager() -> UserManager:
+    """The process's single UserManager (stateless apart from the shared FirestoreManager)"""
+    return UserManager()
+
+
 class AdminInterface:
     """Streamlit interface for managing teams"""
     
     def __init__(self):
-        self.user_manager = UserManager()
+        self.user_manager = get_user_manager()
     
     def show_admin_panel(self):
         """Display admin interface for instructors"""
@@ -1,11 +1,37 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
 
 from .models import SemesterPlan, AgentResponse, EvaluationFeedback
 from .agents.company_agent import CompanyAgent
 from .agents.market_agent import MarketAgent
 from .agents.evaluation_agent import EvaluationAgent
-from .database import FirestoreManager
+from .database import get_firestore_manager
+
+# Each team's company processing and evaluation is an independent LLM round
+# trip, so a batch's teams are worked through side by side
+_team_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="workflow-team")
+
+
+class _PlanFile(SemesterPlan):
+    # Files carry no submission time; it is stamped when the batch loads them
+    submission_timestamp: Optional[datetime] = None
+
+
+def _load_plan_file(file_path: str) -> Optional[SemesterPlan]:
+    """The plan in a JSON plan file, or None if it can't be read"""
+    try:
+        with open(file_path, 'rb') as f:
+            # pydantic-core parses and validates the bytes in one go, actions included
+            plan_file = _PlanFile.model_validate_json(f.read())
+        
+        return SemesterPlan.model_construct(**dict(plan_file, submission_timestamp=datetime.now()))
+        
+    except Exception as e:
+        print(f"Error loading plan from {file_path}: {e}")
+        return None
 
 
 class SimulationWorkflow:
@@ -13,7 +39,7 @@ class SimulationWorkflow:
         self.company_agent = CompanyAgent()
         self.market_agent = MarketAgent()
         self.evaluation_agent = EvaluationAgent()
-        self.db = FirestoreManager()
+        self.db = get_firestore_manager()
     
     def process_semester_plans(self, plans: List[SemesterPlan]) -> Dict[str, Any]:
         """
@@ -33,9 +59,23 @@ class SimulationWorkflow:
         
         # Step 2: Company agent processes each plan
         print("Step 2: Company agents evaluating plans...")
+        # One batched read for every team in the batch instead of one per plan
+        self.db.get_airline_states([plan.team_id for plan in plans])
+        # Teams run side by side, but one team's plans run one after another in a
+        # single task: each spends from the airline state the previous one saved
+        plans_by_team = {}
         for plan in plans:
-            try:
-                company_response = self.company_agent.process_plan(plan, plan.team_id)
+            plans_by_team.setdefault(plan.team_id, []).append(plan)
+        team_futures = {
+            team_id: _team_executor.submit(self._process_team_plans, team_plans)
+            for team_id, team_plans in plans_by_team.items()
+        }
+        team_outcomes = {team_id: iter(future.result()) for team_id, future in team_futures.items()}
+        # Collected in plan order, so the market's input keeps the plans' order; as
+        # when plans ran one by one, a team's result is its last plan's
+        for plan in plans:
+            company_response, error = next(team_outcomes[plan.team_id])
+            if error is None:
                 company_responses.append(company_response)
                 
                 results[plan.team_id] = {
@@ -44,11 +84,11 @@ class SimulationWorkflow:
                     "status": "company_processed"
                 }
                 
-            except Exception as e:
-                print(f"Error processing plan for team {plan.team_id}: {e}")
+            else:
+                print(f"Error processing plan for team {plan.team_id}: {error}")
                 results[plan.team_id] = {
                     "plan": plan,
-                    "error": str(e),
+                    "error": str(error),
                     "status": "company_failed"
                 }
         
@@ -56,37 +96,58 @@ class SimulationWorkflow:
         print("Step 3: Market agent evaluating market performance...")
         try:
             market_results = self.market_agent.evaluate_market_performance(company_responses)
-            
-            # Update results with market information
-            for team_id in results:
-                if results[team_id]["status"] == "company_processed":
-                    results[team_id]["market_results"] = market_results
-                    results[team_id]["status"] = "market_processed"
-            
+            market_processed = True
         except Exception as e:
             print(f"Error in market evaluation: {e}")
             # Continue with individual evaluations even if market fails
             market_results = None
+            market_processed = False
         
         # Step 4: Evaluation agent provides feedback
         print("Step 4: Evaluation agent providing feedback...")
+        # One pass over the results records the market outcome and collects the teams to evaluate
+        evaluable = []
         for team_id, result in results.items():
-            if result["status"] in ["company_processed", "market_processed"]:
-                try:
-                    evaluation = self.evaluation_agent.evaluate_team_performance(
-                        team_id=team_id,
-                        plan=result["plan"],
-                        company_response=result["company_response"],
-                        market_results=market_results or {}
-                    )
-                    
-                    result["evaluation"] = evaluation
-                    result["status"] = "completed"
-                    
-                except Exception as e:
-                    print(f"Error evaluating team {team_id}: {e}")
-                    result["evaluation_error"] = str(e)
-                    result["status"] = "evaluation_failed"
+            if "company_response" not in result:
+                continue
+            if market_processed:
+                result["market_results"] = market_results
+                result["status"] = "market_processed"
+            evaluable.append((team_id, result))
+        
+        # With a shared market outcome, teams are evaluated in batched AI requests;
+        # any team a batch didn't cover is evaluated on its own below
+        evaluations = {}
+        if market_processed and len(evaluable) > 1:
+            try:
+                evaluations = self.evaluation_agent.evaluate_batch(
+                    submissions=[(result["plan"], result["company_response"]) for _, result in evaluable],
+                    market_results=market_results
+                )
+            except Exception as e:
+                print(f"Error in batched evaluation: {e}")
+        
+        evaluation_futures = [
+            (team_id, result, None if team_id in evaluations else _team_executor.submit(
+                self.evaluation_agent.evaluate_team_performance,
+                team_id=team_id,
+                plan=result["plan"],
+                company_response=result["company_response"],
+                market_results=market_results or {}
+            ))
+            for team_id, result in evaluable
+        ]
+        for team_id, result, future in evaluation_futures:
+            try:
+                evaluation = evaluations[team_id] if future is None else future.result()
+                
+                result["evaluation"] = evaluation
+                result["status"] = "completed"
+                
+            except Exception as e:
+                print(f"Error evaluating team {team_id}: {e}")
+                result["evaluation_error"] = str(e)
+                result["status"] = "evaluation_failed"
         
         # Step 5: Results are now ready for students (returned by this method)
         print("Step 5: Results ready for students")
@@ -107,8 +168,7 @@ class SimulationWorkflow:
     def get_simulation_status(self) -> Dict[str, Any]:
         """Get current simulation status and statistics"""
         try:
-            all_airlines = self.db.get_all_airline_states()
-            market_state = self.db.get_market_state()
+            all_airlines, market_state = self.db.get_all_airline_and_market_states()
             
             status = {
                 "timestamp": datetime.now().isoformat(),
@@ -133,29 +193,44 @@ class SimulationWorkflow:
         except Exception as e:
             return {"error": str(e), "timestamp": datetime.now().isoformat()}
     
+    def _process_team_plans(self, plans: List[SemesterPlan]) -> List[tuple]:
+        """(company response, None) or (None, error) for each of one team's plans, processed in order"""
+        outcomes = []
+        for plan in plans:
+            try:
+                outcomes.append((self.company_agent.process_plan(plan, plan.team_id), None))
+            except Exception as e:
+                outcomes.append((None, e))
+        return outcomes
+    
     def _get_top_performers(self, airlines: List) -> Dict[str, Any]:
         """Identify top performing airlines across different metrics"""
         if not airlines:
             return {}
         
-        # Sort by different metrics
-        by_market_share = sorted(airlines, key=lambda x: x.market_share, reverse=True)
-        by_reputation = sorted(airlines, key=lambda x: x.reputation, reverse=True)
-        by_cash = sorted(airlines, key=lambda x: x.cash, reverse=True)
+        # One pass for all three leaders; ties go to the earliest airline, as the sorts did
+        market_leader = highest_reputation = most_cash = airlines[0]
+        for airline in airlines[1:]:
+            if airline.market_share > market_leader.market_share:
+                market_leader = airline
+            if airline.reputation > highest_reputation.reputation:
+                highest_reputation = airline
+            if airline.cash > most_cash.cash:
+                most_cash = airline
         
         return {
             "market_leader": {
-                "team_id": by_market_share[0].team_id,
-                "market_share": by_market_share[0].market_share
-            } if by_market_share else None,
+                "team_id": market_leader.team_id,
+                "market_share": market_leader.market_share
+            },
             "highest_reputation": {
-                "team_id": by_reputation[0].team_id,
-                "reputation": by_reputation[0].reputation
-            } if by_reputation else None,
+                "team_id": highest_reputation.team_id,
+                "reputation": highest_reputation.reputation
+            },
             "most_cash": {
-                "team_id": by_cash[0].team_id,
-                "cash": by_cash[0].cash
-            } if by_cash else None
+                "team_id": most_cash.team_id,
+                "cash": most_cash.cash
+            }
         }
     
     def reset_simulation(self) -> bool:
@@ -171,30 +246,83 @@ class SimulationWorkflow:
     
     def batch_process_from_files(self, file_paths: List[str]) -> Dict[str, Any]:
         """Process multiple plan files in batch"""
-        import json
-        from .models import AirlineAction
-        
-        plans = []
-        
-        for file_path in file_paths:
-            try:
-                with open(file_path, 'r') as f:
-                    plan_data = json.load(f)
-                
-                plan = SemesterPlan(
-                    team_id=plan_data["team_id"],
-                    semester=plan_data["semester"],
-                    actions=[AirlineAction(**action) for action in plan_data["actions"]],
-                    total_budget=plan_data["total_budget"],
-                    submission_timestamp=datetime.now()
-                )
-                
-                plans.append(plan)
-                
-            except Exception as e:
-                print(f"Error loading plan from {file_path}: {e}")
+        # Reading each file is mostly waiting on the disk, so overlap the reads
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            plans = [plan for plan in executor.map(_load_plan_file, file_paths) if plan is not None]
         
         if plans:
             return self.process_semester_plans(plans)
         else:
-            return {"error": "No valid plans found in provided files"}
\ No newline at end of file
+            return {"error": "No valid plans found in provided files"}
+
+
+class PlanBatcher:
+    """Coalesces plan submissions that arrive within a short window into one workflow run.
+    
+    Each submission gets a Future that resolves to that team's slice of the
+    workflow results (``{team_id: result}``), the same shape returned by
+    ``process_semester_plans([plan])``. Batches run one at a time, so plans
+    submitted while a batch is processing are picked up by the next one.
+    """
+    
+    def __init__(self, workflow: Optional[SimulationWorkflow] = None,
+                 window_seconds: float = 0.5, max_batch_size: int = 20):
+        self._workflow = workflow
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._timer = None
+    
+    def submit(self, plan: SemesterPlan) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending.append((plan, future))
+            if self._timer is None:
+                self._schedule_drain()
+        return future
+    
+    def _schedule_drain(self):
+        # Caller holds self._lock
+        self._timer = threading.Timer(self.window_seconds, self._drain)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _drain(self):
+        with self._run_lock:
+            with self._lock:
+                # One plan per team per batch; results are keyed by team_id
+                batch = []
+                deferred = []
+                teams = set()
+                while self._pending and len(batch) < self.max_batch_size:
+                    plan, future = self._pending.popleft()
+                    if plan.team_id in teams:
+                        deferred.append((plan, future))
+                    else:
+                        teams.add(plan.team_id)
+                        batch.append((plan, future))
+                self._pending.extendleft(reversed(deferred))
+                
+                self._timer = None
+                if self._pending:
+                    self._schedule_drain()
+            
+            if batch:
+                self._run_batch(batch)
+    
+    def _run_batch(self, batch):
+        print(f"Processing batch of {len(batch)} submitted plans...")
+        try:
+            if self._workflow is None:
+                self._workflow = SimulationWorkflow()
+            results = self._workflow.process_semester_plans([plan for plan, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for plan, future in batch:
+            team_results = {plan.team_id: results[plan.team_id]} if plan.team_id in results else {}
+            future.set_result(team_results)